@@ -1,153 +1,296 @@
 #!/usr/bin/env python3
 # BMP Parser - Refactored for GUI integration
 
+import os
+import struct
+import threading
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+
+# Precompiled header layouts (little-endian)
+# BITMAPFILEHEADER: signature, file size, reserved1, reserved2, data offset
+_FILE_HDR = struct.Struct('<2sIHHI')
+# BITMAPINFOHEADER: the 40-byte base shared by every modern DIB header
+_INFO_HDR40 = struct.Struct('<IiiHHIIiiII')
+_INFO_SIZE = struct.Struct('<I')
+
+# Bound once so parse() skips the attribute lookups on every call
+_unpack_file = _FILE_HDR.unpack_from
+_unpack_info = _INFO_HDR40.unpack_from
+_unpack_info_size = _INFO_SIZE.unpack_from
+_basename = os.path.basename
+
+# File header plus the largest DIB header (BITMAPV5HEADER, 124 bytes)
+_HEADER_READ_SIZE = 14 + 124
+
+# Headers are read into a reusable per-thread buffer, so parsing many
+# files allocates nothing for the header bytes
+_local = threading.local()
+
+
+def _header_buffer():
+    """Return this thread's reusable header buffer"""
+    buf = getattr(_local, 'buf', None)
+    if buf is None:
+        buf = _local.buf = bytearray(_HEADER_READ_SIZE)
+    return buf
+
+# Lookup tables for human readable descriptions
+_COMPRESSION_NAMES = {
+    0: "BI_RGB (No compression)",
+    1: "BI_RLE8 (8-bit RLE)",
+    2: "BI_RLE4 (4-bit RLE)",
+    3: "BI_BITFIELDS",
+    4: "BI_JPEG",
+    5: "BI_PNG"
+}
+
+_DEPTH_DESC = {
+    1: "1-bit (Monochrome)",
+    4: "4-bit (16 colors)",
+    8: "8-bit (256 colors)",
+    16: "16-bit (High Color)",
+    24: "24-bit (True Color)",
+    32: "32-bit (True Color + Alpha)"
+}
+
+# (unit, divisor) for format_file_size, indexed by magnitude
+_SIZE_UNITS = (('bytes', 1), ('KB', 1024), ('MB', 1024 * 1024))
+
+# Default BI_RGB 16-bit layout (X1R5G5B5) and the BI_BITFIELDS mask offset
+_RGB555_MASKS = (0x7C00, 0x03E0, 0x001F, 0)
+_MASKS_OFFSET = 14 + 40
+
+# BITMAPINFOHEADER fields in on-disk order, followed by values derived
+# from them at parse time
+BMPInfoHeader = namedtuple('BMPInfoHeader', (
+    'header_size width height planes bits_per_pixel compression image_size '
+    'x_pixels_per_meter y_pixels_per_meter colors_used colors_important '
+    'height_abs top_down'
+))
+
+
+class UnsupportedBMPError(ValueError):
+    """A valid BMP whose pixel encoding this parser cannot decode"""
+
+
+def _unpack_masks(data, count):
+    """Unpack ``count`` little-endian DWORD channel masks"""
+    return struct.unpack(f'<{count}I', data)
+
+
+def _expand_mask(values, mask):
+    """Extract the bits selected by ``mask`` and scale them to 0..255"""
+    if not mask:
+        return np.zeros(values.shape, dtype=np.uint8)
+    shift = (mask & -mask).bit_length() - 1
+    top = mask >> shift
+    channel = (values.astype(np.uint64) >> shift) & top
+    return (channel * 255 // top).astype(np.uint8)
+
+
 class BMPParser:
     def __init__(self, filepath):
         self.filepath = filepath
-        self.file_header = {}
-        self.info_header = {}
+        # File header fields, set by parse()
+        self.signature = None
+        self.file_size = 0
+        self.reserved1 = 0
+        self.reserved2 = 0
+        self.data_offset = 0
+        self.info_header = None
         self.parsed = False
     
-    def bytes_to_uint16_le(self, data, offset=0):
-        """Convert 2 bytes to unsigned 16-bit integer (little-endian)"""
-        return data[offset] + (data[offset + 1] << 8)
-    
-    def bytes_to_uint32_le(self, data, offset=0):
-        """Convert 4 bytes to unsigned 32-bit integer (little-endian)"""
-        return (data[offset] + 
-                (data[offset + 1] << 8) + 
-                (data[offset + 2] << 16) + 
-                (data[offset + 3] << 24))
-    
-    def bytes_to_int32_le(self, data, offset=0):
-        """Convert 4 bytes to signed 32-bit integer (little-endian)"""
-        value = self.bytes_to_uint32_le(data, offset)
-        # Handle two's complement for negative numbers
-        if value >= 2**31:
-            value -= 2**32
-        return value
+    @property
+    def file_header(self):
+        """File header fields as a dictionary, built on demand"""
+        if self.signature is None:
+            return {}
+        return {
+            'signature': self.signature,
+            'file_size': self.file_size,
+            'reserved1': self.reserved1,
+            'reserved2': self.reserved2,
+            'data_offset': self.data_offset
+        }
     
     def get_compression_name(self, compression_code):
         """Convert compression code to readable name"""
-        compressions = {
-            0: "BI_RGB (No compression)",
-            1: "BI_RLE8 (8-bit RLE)",
-            2: "BI_RLE4 (4-bit RLE)",
-            3: "BI_BITFIELDS",
-            4: "BI_JPEG",
-            5: "BI_PNG"
-        }
-        return compressions.get(compression_code, f"Unknown ({compression_code})")
+        return _COMPRESSION_NAMES.get(compression_code, f"Unknown ({compression_code})")
     
     def format_file_size(self, size_bytes):
         """Format file size in human readable format"""
-        if size_bytes < 1024:
+        # Every 10 bits of magnitude is one unit step: bytes, KB, MB
+        idx = min(max(size_bytes.bit_length() - 1, 0) // 10, 2)
+        if idx == 0:
             return f"{size_bytes} bytes"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes:,} bytes ({size_bytes/1024:.1f} KB)"
-        else:
-            return f"{size_bytes:,} bytes ({size_bytes/1024/1024:.1f} MB)"
+        unit, divisor = _SIZE_UNITS[idx]
+        return f"{size_bytes:,} bytes ({size_bytes/divisor:.1f} {unit})"
     
     def get_color_depth_description(self, bits_per_pixel):
         """Get description of color depth"""
-        descriptions = {
-            1: "1-bit (Monochrome)",
-            4: "4-bit (16 colors)",
-            8: "8-bit (256 colors)",
-            16: "16-bit (High Color)",
-            24: "24-bit (True Color)",
-            32: "32-bit (True Color + Alpha)"
-        }
-        return descriptions.get(bits_per_pixel, f"{bits_per_pixel}-bit")
+        return _DEPTH_DESC.get(bits_per_pixel, f"{bits_per_pixel}-bit")
     
     def parse(self):
         """Parse the BMP file and extract header information"""
         try:
             with open(self.filepath, 'rb') as f:
-                # Read file header (14 bytes)
-                file_header_data = f.read(14)
-                if len(file_header_data) < 14:
+                # Read file header and the largest DIB header in one go
+                buf = _header_buffer()
+                n = f.readinto(buf)
+                if n < 14:
                     raise ValueError("Invalid BMP file: too short")
                 
-                # Parse file header manually
-                # Bytes 0-1: Signature
-                signature = chr(file_header_data[0]) + chr(file_header_data[1])
-                
-                if signature != 'BM':
-                    raise ValueError("Not a valid BMP file")
-                
-                # Bytes 2-5: File size (little-endian)
-                file_size = self.bytes_to_uint32_le(file_header_data, 2)
-                
-                # Bytes 6-7: Reserved 1
-                reserved1 = self.bytes_to_uint16_le(file_header_data, 6)
-                
-                # Bytes 8-9: Reserved 2
-                reserved2 = self.bytes_to_uint16_le(file_header_data, 8)
-                
-                # Bytes 10-13: Data offset
-                data_offset = self.bytes_to_uint32_le(file_header_data, 10)
-                
-                self.file_header = {
-                    'signature': signature,
-                    'file_size': file_size,
-                    'reserved1': reserved1,
-                    'reserved2': reserved2,
-                    'data_offset': data_offset
-                }
-                
-                # Read info header (first 4 bytes to determine size)
-                info_size_data = f.read(4)
-                if len(info_size_data) < 4:
-                    raise ValueError("Invalid BMP file: incomplete info header")
-                
-                info_header_size = self.bytes_to_uint32_le(info_size_data)
-                
-                # Read rest of info header
-                remaining_info = f.read(info_header_size - 4)
-                if len(remaining_info) < info_header_size - 4:
-                    raise ValueError("Invalid BMP file: incomplete info header")
-                
-                # Parse basic info header (BITMAPINFOHEADER - 40 bytes minimum)
-                if info_header_size >= 40:
-                    # Combine all info header data
-                    full_info_data = info_size_data + remaining_info
-                    
-                    # Parse each field manually
-                    header_size = self.bytes_to_uint32_le(full_info_data, 0)
-                    width = self.bytes_to_int32_le(full_info_data, 4)
-                    height = self.bytes_to_int32_le(full_info_data, 8)
-                    planes = self.bytes_to_uint16_le(full_info_data, 12)
-                    bits_per_pixel = self.bytes_to_uint16_le(full_info_data, 14)
-                    compression = self.bytes_to_uint32_le(full_info_data, 16)
-                    image_size = self.bytes_to_uint32_le(full_info_data, 20)
-                    x_pixels_per_meter = self.bytes_to_int32_le(full_info_data, 24)
-                    y_pixels_per_meter = self.bytes_to_int32_le(full_info_data, 28)
-                    colors_used = self.bytes_to_uint32_le(full_info_data, 32)
-                    colors_important = self.bytes_to_uint32_le(full_info_data, 36)
-                    
-                    self.info_header = {
-                        'header_size': header_size,
-                        'width': width,
-                        'height': height,
-                        'planes': planes,
-                        'bits_per_pixel': bits_per_pixel,
-                        'compression': compression,
-                        'image_size': image_size,
-                        'x_pixels_per_meter': x_pixels_per_meter,
-                        'y_pixels_per_meter': y_pixels_per_meter,
-                        'colors_used': colors_used,
-                        'colors_important': colors_important
-                    }
-                else:
-                    raise ValueError("Unsupported BMP format: info header too small")
+                self._parse_headers(buf, n, f)
                 
                 self.parsed = True
                     
         except FileNotFoundError:
-            raise FileNotFoundError("File not found: " + self.filepath)
-        except Exception as e:
-            raise Exception("Error parsing BMP file: " + str(e))
+            raise FileNotFoundError(f"File not found: {self.filepath}") from None
+    
+    def _parse_headers(self, buf, n, f):
+        """Decode the file and info headers from the first ``n`` bytes of ``buf``"""
+        # Parse all five file header fields in one unpack
+        (sig_bytes, self.file_size, self.reserved1,
+         self.reserved2, self.data_offset) = _unpack_file(buf, 0)
+        if sig_bytes != b'BM':
+            raise ValueError("Not a valid BMP file")
+        self.signature = 'BM'
+        
+        # Info header size is the first 4 bytes after the file header
+        if n < 18:
+            raise ValueError("Invalid BMP file: incomplete info header")
+        
+        info_header_size = _unpack_info_size(buf, 14)[0]
+        # Headers larger than BITMAPV5HEADER run past the buffer; only the
+        # first 40 bytes are decoded, so just make sure the rest exists
+        if n == len(buf) and 14 + info_header_size > n:
+            n = os.fstat(f.fileno()).st_size
+        if n < 14 + info_header_size:
+            raise ValueError("Invalid BMP file: incomplete info header")
+        
+        # Parse basic info header (BITMAPINFOHEADER - 40 bytes minimum)
+        if info_header_size >= 40:
+            # Unpack all eleven fields at once; the format string
+            # takes care of signed vs unsigned values. Height sign and
+            # magnitude are needed by every display, so work them out here
+            fields = _unpack_info(buf, 14)
+            height = fields[2]
+            self.info_header = BMPInfoHeader(*fields, abs(height), height < 0)
+        else:
+            raise ValueError("Unsupported BMP format: info header too small")
+    
+    def get_pixel_array(self):
+        """Decode the pixel data into a uint8 array, top row first
+
+        Returns (H, W, 3) RGB, or (H, W, 4) RGBA for bitfield images with an
+        alpha mask. Uncompressed 1/4/8/16/24/32-bit and BI_BITFIELDS 16/32-bit
+        images are supported; anything else raises UnsupportedBMPError
+        """
+        hdr = self.info_header
+        fmt = self._pixel_format()
+        stride, height = fmt[0], hdr.height_abs
+        with open(self.filepath, 'rb') as f:
+            f.seek(self.data_offset)
+            data = np.fromfile(f, np.uint8, stride * height)
+        if data.size < stride * height:
+            raise ValueError("Invalid BMP file: truncated pixel data")
+        
+        rows = data.reshape(height, stride)
+        if not hdr.top_down:
+            rows = rows[::-1]
+        return self._decode_rows(rows, fmt)
+    
+    def iter_rows(self, rows_per_chunk=64):
+        """Yield the decoded image in bands of ``rows_per_chunk`` rows, top first
+
+        Each band is an array in the same layout as ``get_pixel_array()``, but
+        only one band of the file is read and decoded at a time
+        """
+        hdr = self.info_header
+        fmt = self._pixel_format()
+        stride, height = fmt[0], hdr.height_abs
+        with open(self.filepath, 'rb') as f:
+            for top in range(0, height, rows_per_chunk):
+                n = min(rows_per_chunk, height - top)
+                # Bottom-up files store the band's last row first
+                first = top if hdr.top_down else height - top - n
+                f.seek(self.data_offset + first * stride)
+                data = np.fromfile(f, np.uint8, n * stride)
+                if data.size < n * stride:
+                    raise ValueError("Invalid BMP file: truncated pixel data")
+                rows = data.reshape(n, stride)
+                if not hdr.top_down:
+                    rows = rows[::-1]
+                yield self._decode_rows(rows, fmt)
+    
+    def _pixel_format(self):
+        """Check the pixel format is supported and read its palette or masks
+
+        Returns ``(stride, palette_lut, masks)``; the last two are ``None``
+        where they do not apply
+        """
+        if not self.parsed:
+            raise ValueError("File not parsed yet. Call parse() first.")
+        
+        hdr = self.info_header
+        bpp = hdr.bits_per_pixel
+        if not ((hdr.compression == 0 and bpp in _DEPTH_DESC)
+                or (hdr.compression == 3 and bpp in (16, 32))):
+            raise UnsupportedBMPError(
+                f"Pixel decoding not supported for {self.get_compression_name(hdr.compression)}, {bpp}-bit"
+            )
+        
+        # Rows are padded to a multiple of 4 bytes
+        stride = (hdr.width * bpp + 31) // 32 * 4
+        lut = masks = None
+        if bpp <= 8:
+            count = hdr.colors_used or 1 << bpp
+            with open(self.filepath, 'rb') as f:
+                f.seek(14 + hdr.header_size)
+                palette = np.fromfile(f, np.uint8, count * 4).reshape(-1, 4)
+            # Indices past a short palette map to black
+            lut = np.zeros((256, 3), dtype=np.uint8)
+            lut[:len(palette)] = palette[:256, 2::-1]
+        elif hdr.compression == 3:
+            with open(self.filepath, 'rb') as f:
+                f.seek(_MASKS_OFFSET)
+                # The alpha mask is only part of the V3+ headers
+                n_masks = 4 if hdr.header_size >= 56 else 3
+                masks = (*_unpack_masks(f.read(4 * n_masks), n_masks), 0)[:4]
+        elif bpp == 16:
+            masks = _RGB555_MASKS
+        return stride, lut, masks
+    
+    def _decode_rows(self, rows, fmt):
+        """Decode (n, stride) raw rows, already top first, into pixels"""
+        _, lut, masks = fmt
+        hdr = self.info_header
+        bpp = hdr.bits_per_pixel
+        height, width = rows.shape[0], hdr.width
+        
+        if bpp == 24:
+            return np.ascontiguousarray(rows[:, :width * 3].reshape(height, width, 3)[..., ::-1])
+        if bpp == 32 and hdr.compression == 0:
+            # BGRX; the fourth byte is not alpha for BI_RGB
+            return np.ascontiguousarray(rows[:, :width * 4].reshape(height, width, 4)[..., 2::-1])
+        if bpp <= 8:
+            if bpp == 8:
+                index = rows[:, :width]
+            elif bpp == 4:
+                index = np.stack((rows >> 4, rows & 0x0F), axis=-1).reshape(height, -1)[:, :width]
+            else:
+                index = np.unpackbits(rows, axis=1)[:, :width]
+            return lut[index]
+        
+        # 16-bit, or 32-bit bitfields: pull each channel out through its mask
+        values = rows[:, :width * bpp // 8].view('<u2' if bpp == 16 else '<u4')
+        channels = [_expand_mask(values, m) for m in masks[:3]]
+        if masks[3]:
+            channels.append(_expand_mask(values, masks[3]))
+        return np.stack(channels, axis=-1)
     
     def get_summary(self):
         """Return a dictionary of key-value pairs for GUI display"""
@@ -157,12 +300,11 @@ class BMPParser:
         summary = {}
         
         # File information
-        summary["File Size"] = self.format_file_size(self.file_header['file_size'])
+        summary["File Size"] = self.format_file_size(self.file_size)
         
         # Image dimensions and basic info
-        height_abs = abs(self.info_header['height'])
-        summary["Image Dimensions"] = f"{self.info_header['width']} × {height_abs} pixels"
-        summary["Bits per pixel"] = self.get_color_depth_description(self.info_header['bits_per_pixel'])
+        summary["Image Dimensions"] = f"{self.info_header.width} × {self.info_header.height_abs} pixels"
+        summary["Bits per pixel"] = self.get_color_depth_description(self.info_header.bits_per_pixel)
         
         
         return summary
@@ -174,7 +316,7 @@ class BMPParser:
         
         return {
             'file_header': self.file_header,
-            'info_header': self.info_header
+            'info_header': self.info_header._asdict()
         }
     
     def display_info(self):
@@ -183,14 +325,10 @@ class BMPParser:
             print("Error: File not parsed yet. Call parse() first.")
             return
             
-        # Get just the filename without path (manual implementation)
-        filename = self.filepath
-        if '/' in filename:
-            filename = filename.split('/')[-1]
-        if '\\' in filename:
-            filename = filename.split('\\')[-1]
+        # Get just the filename without path
+        filename = _basename(self.filepath)
             
-        print("BMP File Analysis: " + filename)
+        print(f"BMP File Analysis: {filename}")
         print("=" * 50)
         
         # Use the summary data for consistent formatting
@@ -198,6 +336,45 @@ class BMPParser:
         for field, value in summary.items():
             print(f"  {field}: {value}")
 
+def _to_stored_channels(bands, channels):
+    """Pad or trim decoded bands to ``channels`` (3 = RGB, 4 = RGBA)"""
+    for band in bands:
+        if band.shape[2] > channels:
+            band = band[..., :channels]
+        elif band.shape[2] < channels:
+            # Opaque alpha for 32-bit files that decode without one
+            band = np.dstack((band, np.full(band.shape[:2], 255, np.uint8)))
+        yield np.ascontiguousarray(band)
+
+
+def bmp_to_cmpt365(src, dst, alg=None):
+    """Convert a BMP file straight to ``.cmpt365``
+
+    Rows are decoded band by band with ``iter_rows()`` and compressed as
+    they are read, so the decoded image is never held in memory in full.
+    As in the GUI, 32-bit files are stored as 32-bit RGBA and everything
+    else as 24-bit RGB. ``alg`` defaults to ``save_cmpt365``'s codec.
+    Returns the same tuple as ``save_cmpt365``; formats ``iter_rows()``
+    cannot decode raise UnsupportedBMPError
+    """
+    # Imported here so parsing headers never loads the codecs (or Numba)
+    from compression import save_cmpt365
+    
+    parser = BMPParser(src)
+    parser.parse()
+    hdr = parser.info_header
+    bits = 32 if hdr.bits_per_pixel == 32 else 24
+    bands = parser.iter_rows()
+    # Decoding the first band checks the format, so unsupported files fail
+    # before anything is compressed
+    first = next(bands, None)
+    if first is not None:
+        bands = chain((first,), bands)
+    options = {} if alg is None else {'alg': alg}
+    return save_cmpt365(dst, hdr.width, hdr.height_abs, bits,
+                        _to_stored_channels(bands, bits // 8), **options)
+
+
 def main():
     try:
         import sys
@@ -213,7 +390,7 @@ def main():
         parser.display_info()
         
     except Exception as e:
-        print("Error: " + str(e))
+        print(f"Error: {e}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
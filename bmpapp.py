@@ -1,11 +1,93 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from BMPParser import BMPParser
+from BMPParser import BMPParser, UnsupportedBMPError
 from PIL import Image, ImageTk
 import numpy as np
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from compression import save_cmpt365, load_cmpt365, format_size
 
+try:
+    from numba import njit, prange
+except ImportError:  # Numba is optional; ImageProcessor.render falls back to NumPy
+    njit = None
+
+
+def _render_kernel(rgb, alpha, lut, y_idx, x_idx, out):
+    """Per‑channel LUT (brightness + mask) and nearest‑neighbour scale in one pass.
+
+    Each output pixel reads its source pixel once, so no intermediate
+    full‑size buffers are created between the steps.  RGB and alpha come
+    from separate planes and are only interleaved here, in `out`; pass
+    `alpha=None` with a 3‑channel `out` for opaque images.  `y_idx` / `x_idx`
+    give the source row / column of every output row / column.
+    """
+    for y in prange(out.shape[0]):
+        sy = y_idx[y]
+        for x in range(out.shape[1]):
+            sx = x_idx[x]
+            out[y, x, 0] = lut[0, rgb[sy, sx, 0]]
+            out[y, x, 1] = lut[1, rgb[sy, sx, 1]]
+            out[y, x, 2] = lut[2, rgb[sy, sx, 2]]
+            if alpha is not None:
+                out[y, x, 3] = alpha[sy, sx]
+
+
+def _lut_kernel(src, lut, out):
+    """Map channel `c` of every pixel through `lut[c]`, row‑parallel.
+
+    Channels past `lut.shape[0]` (alpha) are copied unchanged.
+    """
+    channels = lut.shape[0]
+    for y in prange(src.shape[0]):
+        for x in range(src.shape[1]):
+            for c in range(src.shape[2]):
+                if c < channels:
+                    out[y, x, c] = lut[c, src[y, x, c]]
+                else:
+                    out[y, x, c] = src[y, x, c]
+
+
+def _nearest_index(n_out: int, n_src: int) -> np.ndarray:
+    """Source index for each of `n_out` samples of an axis `n_src` long.
+
+    Mirrors Pillow's NEAREST resize, which samples pixel centres and steps
+    by `n_src / n_out` with float64 additions; the running sum is
+    reproduced with `cumsum` so the indices match Pillow's bit for bit.
+    """
+    steps = np.full(n_out, n_src / n_out)
+    steps[0] *= 0.5
+    return np.minimum(np.cumsum(steps).astype(np.intp), n_src - 1)
+
+
+@lru_cache(maxsize=8)
+def _scale_tables(
+    height: int, width: int, scale_factor: float
+) -> tuple[int, int, np.ndarray, np.ndarray]:
+    """`(new_width, new_height, y_idx, x_idx)` for scaling a `height × width` image.
+
+    Only depends on the size and the factor, so the tables are built once
+    and shared by every call (and every slider tick) with the same key.
+    They are made read‑only since callers share them.
+    """
+    if scale_factor <= 0:
+        raise ValueError("Scale factor must be positive.")
+    new_width = max(1, int(width * scale_factor))
+    new_height = max(1, int(height * scale_factor))
+    # Source row / column for every output row / column, as Pillow picks
+    # them, so the kernel and the Pillow paths agree
+    y_idx = _nearest_index(new_height, height)
+    x_idx = _nearest_index(new_width, width)
+    y_idx.flags.writeable = False
+    x_idx.flags.writeable = False
+    return new_width, new_height, y_idx, x_idx
+
+
+if njit is not None:
+    _render_kernel = njit(parallel=True, cache=True)(_render_kernel)
+    _lut_kernel = njit(parallel=True, cache=True)(_lut_kernel)
+
 
 class ImageProcessor:
     """Fast image‑processing helpers backed by NumPy vectorisation.
@@ -16,38 +98,133 @@ class ImageProcessor:
     """
 
     def __init__(self):
-        self.original_pixels: np.ndarray | None = None  # (H, W, 4) uint8
+        # Colour and alpha are kept as separate contiguous planes so the
+        # brightness / mask passes never stream the alpha bytes
+        self.rgb: np.ndarray | None = None    # (H, W, 3) uint8
+        self.alpha: np.ndarray | None = None  # (H, W) uint8, None if opaque
+        self._rgba: np.ndarray | None = None  # interleaved copy, built on demand
+        self._rgba_out: np.ndarray | None = None  # reused render() output
+        self._source_image: Image.Image | None = None  # same pixels as PIL, on demand
+        self._scratch: np.ndarray | None = None  # apply_channel_filter output
         self.width: int = 0
         self.height: int = 0
+        # Brightness and channel toggles composed into one table per RGB
+        # channel; rebuilt only when those settings change
+        self._rgb_lut = np.zeros((3, 256), dtype=np.uint8)
+        self._lut_state: tuple | None = None
+        self._lut_factor: float | None = None
+        self._lut: np.ndarray | None = None
 
     # ───────────────────────── IO helpers ────────────────────────── #
     def load_from_pil(self, pil_image: Image.Image) -> None:
-        """Read a PIL image into a uint8 RGBA NumPy array."""
-        pil_image = pil_image.convert("RGBA")  # force unified format
-        self.width, self.height = pil_image.size
-        # shape -> (H, W, 4)
-        self.original_pixels = np.asarray(pil_image, dtype=np.uint8)
+        """Read a PIL image into uint8 RGB (and, if present, alpha) NumPy planes."""
+        # Only images that actually carry transparency pay for an alpha plane
+        has_alpha = "A" in pil_image.getbands() or "transparency" in pil_image.info
+        mode = "RGBA" if has_alpha else "RGB"
+        if pil_image.mode != mode:
+            pil_image = pil_image.convert(mode)
+        self._load_planes(np.asarray(pil_image, dtype=np.uint8), pil_image)
+
+    def load_from_ndarray(self, pixels: np.ndarray) -> None:
+        """Load an `(H, W, 3)` RGB or `(H, W, 4)` RGBA uint8 array directly."""
+        if pixels.ndim != 3 or pixels.shape[2] not in (3, 4):
+            raise ValueError("Expected an (H, W, 3) or (H, W, 4) array")
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        # The PIL copy is only built if a Pillow path asks for it
+        self._load_planes(pixels, None)
+
+    def _load_planes(self, pixels: np.ndarray, source: Image.Image | None) -> None:
+        self.height, self.width = pixels.shape[:2]
+        if pixels.shape[2] == 4:
+            # shape -> (H, W, 4), split into the RGB and alpha planes
+            self.rgb = np.ascontiguousarray(pixels[..., :3])
+            self.alpha = np.ascontiguousarray(pixels[..., 3])
+        else:
+            self.rgb = pixels
+            self.alpha = None
+        # An interleaved RGBA input already is `original_pixels`
+        self._rgba = pixels if self.alpha is not None else None
+        self._scratch = None  # allocated by apply_channel_filter when needed
+        self._source_image = source
+
+    @property
+    def original_pixels(self) -> np.ndarray | None:
+        """The loaded image as one `(H, W, 4)` RGBA array (`(H, W, 3)` if opaque)."""
+        if self.rgb is None or self.alpha is None:
+            return self.rgb
+        if self._rgba is None:
+            self._rgba = np.dstack((self.rgb, self.alpha))
+        return self._rgba
+
+    def _pil_source(self) -> Image.Image:
+        """The loaded image as PIL, built the first time a Pillow path needs it."""
+        if self._source_image is None:
+            if self.rgb is None:
+                raise ValueError("Image not loaded yet.")
+            self._source_image = Image.fromarray(self.original_pixels)
+        return self._source_image
 
     @staticmethod
     def pixels_to_pil_image(pixels: np.ndarray, *_ignored) -> Image.Image:
-        """Convert `(H, W, 4)` uint8 array back to a PIL Image."""
+        """Convert an `(H, W, 3)` or `(H, W, 4)` uint8 array back to a PIL Image."""
         if pixels is None:
             raise ValueError("pixels_to_pil_image received None")
-        return Image.fromarray(pixels, mode="RGBA")
+        return Image.fromarray(pixels)
 
     # ──────────────────────── processors ─────────────────────────── #
+    def _brightness_lut(self, brightness_factor: float) -> np.ndarray:
+        """256-entry uint8 table mapping a channel value to its scaled value.
+
+        Stays in uint8 instead of upcasting the whole image to float32.  The
+        factor is rounded to 0.01 (one slider percent) and the last table is
+        kept, so repaints at an unchanged brightness skip the rebuild.
+        """
+        key = round(brightness_factor, 2)
+        if key != self._lut_factor:
+            self._lut = (np.arange(256, dtype=np.float32) * key).clip(0, 255).astype(np.uint8)
+            self._lut_factor = key
+        return self._lut
+
     def apply_brightness(self, brightness_factor: float) -> np.ndarray:
-        """Return a copy of the original image with brightness scaled.
+        """Return a copy of the original RGB plane with brightness scaled.
 
         `brightness_factor` is in `[0, 1]` where 1 means *no* change (i.e. 100 %).
+        The result is `(H, W, 3)`; alpha lives untouched in `self.alpha`.  At
+        a factor of 1 a read‑only view of the RGB plane is returned instead.
         """
-        if self.original_pixels is None:
+        if self.rgb is None:
             raise ValueError("Image not loaded yet.")
-        # Copy to avoid mutating the stored original
-        arr = self.original_pixels.astype(np.float32)  # float for scaling
-        arr[..., :3] *= brightness_factor  # scale RGB, leave alpha alone
-        np.clip(arr, 0, 255, out=arr)
-        return arr.astype(np.uint8)
+        if brightness_factor == 1.0:
+            unchanged = self.rgb.view()
+            unchanged.flags.writeable = False
+            return unchanged
+        lut = self._brightness_lut(brightness_factor)
+        out = np.empty_like(self.rgb)
+        if njit is not None:
+            _lut_kernel(self.rgb, np.stack((lut, lut, lut)), out)
+        else:
+            np.take(lut, self.rgb, out=out)
+        return out
+
+    def levels_lut(
+        self,
+        brightness_factor: float,
+        show_red: bool = True,
+        show_green: bool = True,
+        show_blue: bool = True,
+    ) -> np.ndarray:
+        """Return the `(3, 256)` uint8 table for brightness + channel mask.
+
+        Both are byte → byte maps per channel, so they compose into a single
+        lookup.  The table is cached and only rebuilt when the settings change.
+        """
+        state = (round(brightness_factor, 2), show_red, show_green, show_blue)
+        if state != self._lut_state:
+            lut = self._brightness_lut(brightness_factor)
+            for c, on in enumerate((show_red, show_green, show_blue)):
+                self._rgb_lut[c] = lut if on else 0
+            self._lut_state = state
+        return self._rgb_lut
 
     def apply_channel_filter(
         self,
@@ -56,8 +233,17 @@ class ImageProcessor:
         show_green: bool = True,
         show_blue: bool = True,
     ) -> np.ndarray:
-        """Zero out selected RGB channels (alpha is untouched)."""
-        filtered = pixels.copy()
+        """Zero out selected RGB channels (alpha is untouched).
+
+        With every channel shown `pixels` itself is returned.  Otherwise the
+        result is written into a scratch buffer that the next call reuses.
+        """
+        if show_red and show_green and show_blue:
+            return pixels
+        filtered = self._scratch
+        if filtered is None or filtered.shape != pixels.shape or filtered.dtype != pixels.dtype:
+            filtered = self._scratch = np.empty_like(pixels)
+        np.copyto(filtered, pixels)
         if not show_red:
             filtered[..., 0] = 0
         if not show_green:
@@ -75,25 +261,137 @@ class ImageProcessor:
     ) -> tuple[np.ndarray, int, int]:
         """Nearest‑neighbour resize entirely in NumPy (★ **fast**).
 
-        Returns `(scaled_pixels, new_width, new_height)`.
+        Picks the same source rows / columns as Pillow's NEAREST resize and
+        `render`, so all give identical pixels.  Returns `(scaled_pixels,
+        new_width, new_height)`.
         """
-        if scale_factor <= 0:
-            raise ValueError("Scale factor must be positive.")
-        new_width = max(1, int(original_width * scale_factor))
-        new_height = max(1, int(original_height * scale_factor))
-
-        # Build the coordinate look‑up tables (INT indices of original image)
-        y_idx = (np.arange(new_height) / scale_factor).astype(np.int32)
-        x_idx = (np.arange(new_width) / scale_factor).astype(np.int32)
+        # Coordinate look‑up tables (INT indices of original image), shared
+        # with `render` and built once per size and factor
+        new_width, new_height, y_idx, x_idx = _scale_tables(
+            original_height, original_width, scale_factor
+        )
 
         # Fancy indexing does the rest – broadcasting (H,1) × (W,) → (H,W)
-        scaled = pixels[y_idx[:, None], x_idx, :]
+        scaled = pixels[y_idx[:, None], x_idx]
         return scaled, new_width, new_height
 
+    def _scale_plan(self, scale_factor: float) -> tuple[int, int, np.ndarray, np.ndarray]:
+        """`(new_width, new_height, y_idx, x_idx)` for scaling the loaded image.
+
+        This only depends on the image size and the factor, so the plan is
+        memoised by `_scale_tables` and reused while neither changes.
+        """
+        return _scale_tables(self.height, self.width, scale_factor)
+
+    def render(
+        self,
+        brightness_factor: float,
+        show_red: bool,
+        show_green: bool,
+        show_blue: bool,
+        scale_factor: float,
+    ) -> tuple[np.ndarray, int, int]:
+        """Brightness → RGB mask → scale, in one fused pass when Numba is present.
+
+        Brightness and the mask are applied through `levels_lut`.
+        Returns `(pixels, new_width, new_height)` like `scale_image_manual`,
+        with `pixels` as `(H, W, 4)` RGBA, or `(H, W, 3)` RGB for opaque
+        images.  The array is reused by the next call of the same shape, so
+        copy it if it has to outlive that.
+        """
+        if self.rgb is None:
+            raise ValueError("Image not loaded yet.")
+        new_width, new_height, y_idx, x_idx = self._scale_plan(scale_factor)
+        lut = self.levels_lut(brightness_factor, show_red, show_green, show_blue)
+        shape = (new_height, new_width, 3 if self.alpha is None else 4)
+        out = self._rgba_out
+        if out is None or out.shape != shape:
+            out = self._rgba_out = np.empty(shape, dtype=np.uint8)
+
+        if njit is None:
+            # Scale first so the LUT only touches the pixels actually shown;
+            # both are per‑pixel, so the order does not change the result.
+            # Pillow's resize walks the source rows in C and picks the same
+            # pixels as the kernel's index tables
+            scaled = np.asarray(
+                self._pil_source().resize((new_width, new_height), Image.Resampling.NEAREST)
+            )
+            for c in range(3):
+                out[..., c] = lut[c].take(scaled[..., c])
+            if self.alpha is not None:
+                out[..., 3] = scaled[..., 3]
+        else:
+            _render_kernel(self.rgb, self.alpha, lut, y_idx, x_idx, out)
+        return out, new_width, new_height
+
+    def render_image(
+        self,
+        brightness_factor: float,
+        show_red: bool,
+        show_green: bool,
+        show_blue: bool,
+        scale_factor: float,
+        max_size: tuple[int, int] | None = None,
+    ) -> Image.Image:
+        """Like `render`, but returns a PIL image ready for display.
+
+        If the scaled image would exceed `max_size` it is fitted inside it
+        (aspect ratio kept) by the same single resize, using BILINEAR so the
+        downsample stays smooth.  Otherwise, without Numba, the whole
+        pipeline stays inside Pillow (NEAREST resize, then `point` with the
+        levels table); with Numba the pixels come from the fused kernel,
+        which picks the same source pixels.
+        """
+        if self.rgb is None:
+            raise ValueError("Image not loaded yet.")
+        new_width, new_height, _, _ = self._scale_plan(scale_factor)
+        resample = Image.Resampling.NEAREST
+        if max_size is not None and (new_width > max_size[0] or new_height > max_size[1]):
+            ratio = min(max_size[0] / new_width, max_size[1] / new_height)
+            new_width = max(1, int(new_width * ratio))
+            new_height = max(1, int(new_height * ratio))
+            resample = Image.Resampling.BILINEAR
+        elif njit is not None:
+            pixels, width, height = self.render(
+                brightness_factor, show_red, show_green, show_blue, scale_factor
+            )
+            # Pillow shares the kernel's buffer for RGBA; RGB has no
+            # matching in‑memory layout, so opaque images are copied once
+            mode = "RGB" if self.alpha is None else "RGBA"
+            return Image.frombuffer(mode, (width, height), pixels, "raw", mode, 0, 1)
+
+        lut = self.levels_lut(brightness_factor, show_red, show_green, show_blue)
+        img = self._pil_source().resize((new_width, new_height), resample)
+        # Point table: 256 entries per band, identity for alpha
+        table = lut.ravel().tolist()
+        if img.mode == "RGBA":
+            table += range(256)
+        return img.point(table)
+
+
+@lru_cache(maxsize=1)
+def _decode_cached(decode, path: str, mtime_ns: int, size: int) -> tuple:
+    """``decode(path)``, remembered for the last file opened.
+
+    Only one entry is kept, since a decoded image can be hundreds of MB.
+    ``mtime_ns`` and ``size`` only make up the key, so a file that changed
+    on disk since it was cached is decoded again.
+    """
+    return decode(path)
+
 
 class BMPApp(tk.Tk):
     """GUI application"""
 
+    # Slider motion is coalesced into one redraw after this many ms of quiet
+    UPDATE_DELAY_MS = 30
+    # Largest preview drawn on the canvas
+    DISPLAY_MAX_SIZE = (800, 600)
+    # How often a running background compression is checked for completion
+    COMPRESS_POLL_MS = 100
+    # How often a file being decoded in the background is checked
+    LOAD_POLL_MS = 20
+
     def __init__(self):
         super().__init__()
         self.title("BMP Inspector (NumPy Edition)")
@@ -102,12 +400,24 @@ class BMPApp(tk.Tk):
         self.processor = ImageProcessor()
         self.current_image_path: str | None = None
         self.photo: ImageTk.PhotoImage | None = None
+        # Mode `self.photo` was created with; `paste` converts to it
+        self._photo_mode: str | None = None
         self.bits_per_pixel: int = 32
 
         # Raw pixel data in the image's original colour depth. ``None`` until an
         # image is loaded.  ``self.bits_per_pixel`` describes the format.
         self.raw_pixels: bytes | None = None
 
+        # Pending ``after`` callback for a debounced redraw, if any
+        self._after_id: str | None = None
+
+        # Compression runs off the Tk thread so the window stays responsive
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._compress_job: Future | None = None
+        # Files are decoded on their own thread, so opening one is never
+        # queued behind a running compression
+        self._load_pool = ThreadPoolExecutor(max_workers=1)
+        self._load_job: Future | None = None
 
         # Control variables
         self.brightness_var = tk.DoubleVar(value=100.0)  # percent
@@ -128,7 +438,8 @@ class BMPApp(tk.Tk):
         file_frame.pack(fill="x", pady=(0, 10))
         ttk.Button(file_frame, text="Open BMP…", command=self.open_file).pack(side="left")
         ttk.Button(file_frame, text="Open .cmpt365…", command=self.open_cmpt_file).pack(side="left", padx=(10, 0))
-        ttk.Button(file_frame, text="Compress to .cmpt365", command=self.compress_current_image).pack(side="left", padx=(10, 0))
+        self.compress_button = ttk.Button(file_frame, text="Compress to .cmpt365", command=self.compress_current_image)
+        self.compress_button.pack(side="left", padx=(10, 0))
 
         # Split left (controls/info) and right (preview)
         paned = ttk.PanedWindow(main_frame, orient="horizontal")
@@ -156,7 +467,7 @@ class BMPApp(tk.Tk):
             variable=self.brightness_var,
             from_=0,
             to=100,
-            command=self.update_image,
+            command=self._schedule_update,
         )
 
         # Scale slider
@@ -166,7 +477,7 @@ class BMPApp(tk.Tk):
             variable=self.scale_var,
             from_=10,
             to=100,
-            command=self.update_image,
+            command=self._schedule_update,
         )
 
         # RGB toggle buttons
@@ -207,10 +518,10 @@ class BMPApp(tk.Tk):
         self.tree.heading("value", text="Value")
         self.tree.column("field", width=200, anchor="w")
         self.tree.column("value", width=400, anchor="w")
-        scroll = ttk.Scrollbar(props, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scroll.set)
+        self._tree_scroll = ttk.Scrollbar(props, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._tree_scroll.set)
         self.tree.pack(side="left", fill="both", expand=True)
-        scroll.pack(side="right", fill="y")
+        self._tree_scroll.pack(side="right", fill="y")
 
         self.update_channel_buttons()
 
@@ -238,31 +549,7 @@ class BMPApp(tk.Tk):
         )
         if not path:
             return
-        try:
-            parser = BMPParser(path)
-            parser.parse()
-            self._populate_table(parser.get_summary())
-            self.bits_per_pixel = parser.info_header.get("bits_per_pixel", 32)
-
-            img = Image.open(path)
-            # Store raw pixel bytes.  Any non‑24/32‑bit image is converted to
-            # 24‑bit RGB for simplicity.
-            if self.bits_per_pixel == 32:
-                raw = img.convert("RGBA")
-            elif self.bits_per_pixel == 24:
-                raw = img.convert("RGB")
-            else:
-                raw = img.convert("RGB")
-                self.bits_per_pixel = 24
-            self.raw_pixels = raw.tobytes()
-
-            # Convert to RGBA for display regardless of original depth
-            self.processor.load_from_pil(img.convert("RGBA"))
-            self.current_image_path = path
-            self.reset_controls()
-            self.update_image()
-        except Exception as exc:
-            messagebox.showerror("Error", str(exc))
+        self._start_load(self._decode_bmp, path)
 
     def open_cmpt_file(self):
         path = filedialog.askopenfilename(
@@ -271,55 +558,135 @@ class BMPApp(tk.Tk):
         )
         if not path:
             return
+        self._start_load(self._decode_cmpt, path)
+
+    @staticmethod
+    def _decode_bmp(path: str) -> tuple:
+        """Parse and decode a BMP; runs on the loader thread, so no Tk calls"""
+        parser = BMPParser(path)
+        parser.parse()
+        bits_per_pixel = parser.info_header.bits_per_pixel
+
         try:
-            width, height, bpp, pixels = load_cmpt365(path)
-            bytes_per_pixel = (bpp + 7) // 8
-            arr = np.frombuffer(pixels, dtype=np.uint8)
-            arr = arr.reshape((height, width, bytes_per_pixel))
-            mode = "RGBA" if bytes_per_pixel == 4 else "RGB"
-            pil_img = Image.fromarray(arr, mode=mode)
-            if mode != "RGBA":
-                pil_img_for_display = pil_img.convert("RGBA")
-            else:
-                pil_img_for_display = pil_img
-            self.processor.load_from_pil(pil_img_for_display)
-            self.bits_per_pixel = bpp
-            self.raw_pixels = pixels
-
-            self.current_image_path = None
-            summary = {
-                "File Size": format_size(os.path.getsize(path)),
-                "Image Dimensions": f"{width} × {height} pixels",
-                "Bits per pixel": BMPParser("").get_color_depth_description(bpp),
-
-            }
-            self._populate_table(summary)
-            self.reset_controls()
-            self.update_image()
+            # Decode straight from the parsed file, no second decoder
+            pixels = parser.get_pixel_array()
+        except UnsupportedBMPError:
+            # RLE / JPEG / PNG payloads: let Pillow handle them, picking RGB
+            # or RGBA the same way `load_from_pil` does
+            processor = ImageProcessor()
+            processor.load_from_pil(Image.open(path))
+            pixels = processor.original_pixels
+
+        # Store raw pixel bytes.  Any non‑24/32‑bit image is converted to
+        # 24‑bit RGB for simplicity.
+        if bits_per_pixel == 32:
+            full = pixels
+            if full.shape[2] == 3:
+                full = np.dstack((full, np.full(full.shape[:2], 255, np.uint8)))
+            raw_pixels = full.tobytes()
+        else:
+            raw_pixels = np.ascontiguousarray(pixels[..., :3]).tobytes()
+            bits_per_pixel = 24
+        if len(raw_pixels) == pixels.nbytes:
+            # Same layout: view the bytes instead of keeping a second copy
+            pixels = np.frombuffer(raw_pixels, dtype=np.uint8).reshape(pixels.shape)
+        else:
+            pixels.setflags(write=False)
+        return pixels, bits_per_pixel, raw_pixels, parser.get_summary(), path
+
+    @staticmethod
+    def _decode_cmpt(path: str) -> tuple:
+        """Load and decompress a .cmpt365 file; runs on the loader thread"""
+        width, height, bpp, pixels = load_cmpt365(path)
+        bytes_per_pixel = (bpp + 7) // 8
+        arr = np.frombuffer(pixels, dtype=np.uint8)
+        arr = arr.reshape((height, width, bytes_per_pixel))
+        summary = {
+            "File Size": format_size(os.path.getsize(path)),
+            "Image Dimensions": f"{width} × {height} pixels",
+            "Bits per pixel": BMPParser("").get_color_depth_description(bpp),
+
+        }
+        return arr, bpp, pixels, summary, None
+
+    @staticmethod
+    def _load(decode, path: str) -> tuple:
+        """Run ``decode(path)``, reusing the result if the file is unchanged.
+
+        The cache only holds the read-only decoded array and its metadata;
+        each open gets a fresh `ImageProcessor`, so no LUT, scale plan or
+        scratch buffer carries over from an earlier session.
+        """
+        st = os.stat(path)
+        pixels, bpp, raw_pixels, summary, source = _decode_cached(
+            decode, path, st.st_mtime_ns, st.st_size
+        )
+        processor = ImageProcessor()
+        processor.load_from_ndarray(pixels)
+        return processor, bpp, raw_pixels, summary, source
+
+    def _start_load(self, decode, path: str):
+        """Decode ``path`` off the Tk thread; the newest request wins"""
+        self._load_job = self._load_pool.submit(self._load, decode, path)
+        self.after(self.LOAD_POLL_MS, self._check_load, self._load_job)
+
+    def _check_load(self, job: Future):
+        if job is not self._load_job:
+            return  # superseded by a later open
+        if not job.done():
+            self.after(self.LOAD_POLL_MS, self._check_load, job)
+            return
+        self._load_job = None
+        try:
+            processor, bpp, raw_pixels, summary, path = job.result()
         except Exception as exc:
             messagebox.showerror("Error", str(exc))
+            return
+        # Swapped in whole on the Tk thread, so a redraw never sees a
+        # half-loaded image
+        self.processor = processor
+        self.bits_per_pixel = bpp
+        self.raw_pixels = raw_pixels
+        self.current_image_path = path
+        self._populate_table(summary)
+        self.reset_controls()
+        self.update_image()
 
     def compress_current_image(self):
-        if self.processor.original_pixels is None:
+        if self.processor.rgb is None:
             messagebox.showerror("Error", "No image loaded")
             return
+        if self._compress_job is not None:
+            messagebox.showinfo("Compression", "A compression is already running.")
+            return
         path = filedialog.asksaveasfilename(
             defaultextension=".cmpt365",
             filetypes=[("CMPT365 Image", "*.cmpt365"), ("All files", "*.*")],
         )
         if not path:
             return
+        width = self.processor.width
+        height = self.processor.height
+        if self.raw_pixels is None:
+            pixels = self.processor.original_pixels.tobytes()
+        else:
+            pixels = self.raw_pixels
+        bits = (len(pixels) * 8) // (width * height)
+        self._compress_job = self._pool.submit(
+            save_cmpt365, path, width, height, bits, pixels
+        )
+        self.compress_button.configure(text="Compressing…", state="disabled")
+        self.after(self.COMPRESS_POLL_MS, self._check_compression)
+
+    def _check_compression(self):
+        job = self._compress_job
+        if not job.done():
+            self.after(self.COMPRESS_POLL_MS, self._check_compression)
+            return
+        self._compress_job = None
+        self.compress_button.configure(text="Compress to .cmpt365", state="normal")
         try:
-            width = self.processor.width
-            height = self.processor.height
-            if self.raw_pixels is None:
-                pixels = self.processor.original_pixels.tobytes()
-            else:
-                pixels = self.raw_pixels
-            bits = (len(pixels) * 8) // (width * height)
-            orig, comp, ms = save_cmpt365(
-                path, width, height, bits, pixels
-            )
+            orig, comp, ms = job.result()
             ratio = orig / comp if comp else 0
             if ratio < 1:
                 messagebox.showwarning(
@@ -337,9 +704,15 @@ class BMPApp(tk.Tk):
             messagebox.showerror("Error", str(exc))
 
     def _populate_table(self, data: dict):
-        self.tree.delete(*self.tree.get_children())
+        # Unmapped while it is refilled, so the rows are laid out once on
+        # re-pack instead of after every insert
+        tree = self.tree
+        tree.pack_forget()
+        tree.delete(*tree.get_children())
+        insert = tree.insert
         for k, v in data.items():
-            self.tree.insert("", "end", values=(k, v))
+            insert("", "end", values=(k, v))
+        tree.pack(side="left", fill="both", expand=True, before=self._tree_scroll)
 
     # ───────────────────────── Image updates ─────────────────────── #
     def toggle_channel(self, channel: str):
@@ -367,32 +740,48 @@ class BMPApp(tk.Tk):
         self.show_blue.set(True)
         self.update_channel_buttons()
 
+    def _schedule_update(self, *_):
+        """Debounced `update_image` for slider callbacks.
+
+        Every slider tick restarts the timer, so a drag triggers one redraw
+        once it pauses instead of one per intermediate value.
+        """
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(self.UPDATE_DELAY_MS, self.update_image)
+
     def update_image(self, *_):
-        if self.processor.original_pixels is None:
+        # A direct call supersedes any pending debounced one
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        if self.processor.rgb is None:
             return
         try:
-            # 1. brightness
-            bright = self.processor.apply_brightness(self.brightness_var.get() / 100.0)
-            # 2. RGB mask
-            masked = self.processor.apply_channel_filter(
-                bright,
+            # 1‑3. brightness → RGB mask → scale (fused when Numba is present)
+            pil_img = self.processor.render_image(
+                self.brightness_var.get() / 100.0,
                 self.show_red.get(),
                 self.show_green.get(),
                 self.show_blue.get(),
+                self.scale_var.get() / 100.0,
+                # limit GUI preview for performance (same resize, no 2nd pass)
+                max_size=self.DISPLAY_MAX_SIZE,
             )
-            # 3. scale
-            scale = self.scale_var.get() / 100.0
-            scaled_pixels, new_w, new_h = self.processor.scale_image_manual(
-                masked, self.processor.width, self.processor.height, scale
-            )
-            # 4. display
-            pil_img = self.processor.pixels_to_pil_image(scaled_pixels)
-            # limit GUI thumbnail for performance
-            display_img = pil_img.copy()
-            if display_img.width > 800 or display_img.height > 600:
-                display_img.thumbnail((800, 600), Image.Resampling.LANCZOS)
-            self.photo = ImageTk.PhotoImage(display_img)
-            self.image_label.configure(image=self.photo)
+            # 4. display – paste into the existing Tk image while the size and
+            # mode are unchanged instead of allocating a new one every tick.
+            # The mode is fixed at creation, so an RGBA image pasted into an
+            # RGB PhotoImage would lose its alpha
+            if (
+                self.photo is not None
+                and self._photo_mode == pil_img.mode
+                and (self.photo.width(), self.photo.height()) == pil_img.size
+            ):
+                self.photo.paste(pil_img)
+            else:
+                self.photo = ImageTk.PhotoImage(pil_img)
+                self._photo_mode = pil_img.mode
+                self.image_label.configure(image=self.photo)
             self.image_canvas.configure(scrollregion=self.image_canvas.bbox("all"))
         except Exception as exc:
             print(f"Error updating image: {exc}")
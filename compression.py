@@ -1,97 +1,100 @@
-"""Simple LZW compression utilities for CMPT365 files."""
+"""Compression utilities for CMPT365 files (zlib, LZW and a simple LZMA)."""
 
 from __future__ import annotations
 
+import io
+import mmap
+import os
+import struct
+import tempfile
 import time
+import zlib
+from array import array
+from collections import deque
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice, repeat
 
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the kernels then run as plain Python
+    njit = None
 
-class LZMA:
-    """Very small LZMA-like compressor using a simple LZ77 scheme.
 
-    This is **not** a full LZMA implementation but provides a minimal
-    dictionary based compressor so the application can operate without
-    external libraries.
-    """
+# 3-byte hash used to index previous positions in the LZ77 window
+_HASH_BITS = 15
+_HASH_SIZE = 1 << _HASH_BITS
 
-    WINDOW_SIZE = 4096
-    MIN_MATCH = 3
-    MAX_MATCH = 255
 
-    @staticmethod
-    def _match_length(arr: np.ndarray, pos: int, dist: int) -> int:
-        """Return match length of ``arr[pos:]`` with ``arr[pos-dist:]``."""
-        max_len = min(LZMA.MAX_MATCH, arr.size - pos, dist)
-        if max_len <= 0:
-            return 0
-        a = arr[pos : pos + max_len]
-        b = arr[pos - dist : pos - dist + max_len]
-        cmp = a == b
-        # find index of first mismatch
-        if not np.all(cmp):
-            return int(np.argmax(~cmp))
-        return int(max_len)
+def _lz77_encode(data, out, head, prev, window_size, min_match, max_match, max_chain):
+    """Greedy LZ77 encode ``data`` into ``out`` and return the bytes written.
 
-    @staticmethod
-    def compress(data: bytes) -> bytes:
-        """Compress ``data`` using a small LZ77 scheme accelerated with NumPy."""
-        arr = np.frombuffer(data, dtype=np.uint8)
-        out = bytearray()
-        i = 0
-        n = arr.size
-        while i < n:
-            window_start = max(0, i - LZMA.WINDOW_SIZE)
-            match_len = 0
-            match_dist = 0
-            for dist in range(1, i - window_start + 1):
-                length = LZMA._match_length(arr, i, dist)
-                if length > match_len:
-                    match_len = length
+    Candidate matches come from zlib-style hash chains: ``head`` maps the
+    hash of the next three bytes to the most recent position with that
+    hash (``-1`` if none) and ``prev`` is a ring buffer of ``window_size``
+    links back to older positions.  At most ``max_chain`` candidates are
+    probed per position, so the work per byte no longer grows with the
+    window.
+
+    ``out`` must hold at least ``2 * len(data)`` bytes (every literal costs
+    two).  Written with explicit loops so Numba can compile it to native
+    code; without Numba it runs unchanged over ``bytes``/``bytearray``.
+    """
+    n = len(data)
+    mask = _HASH_SIZE - 1
+    i = 0
+    o = 0
+    while i < n:
+        match_len = 0
+        match_dist = 0
+        if i + 2 < n:
+            h = ((int(data[i]) << 10) ^ (int(data[i + 1]) << 5) ^ int(data[i + 2])) & mask
+            cand = head[h]
+            chain = 0
+            while cand >= 0 and chain < max_chain:
+                dist = i - cand
+                if dist > window_size:
+                    break
+                j = 0
+                while j < max_match and i + j < n and data[cand + j] == data[i + j]:
+                    j += 1
+                if j > match_len:
+                    match_len = j
                     match_dist = dist
-                    if match_len == LZMA.MAX_MATCH:
+                    if j == max_match:
                         break
-            if match_len >= LZMA.MIN_MATCH:
-                out.append(1)
-                out.extend(match_dist.to_bytes(2, "big"))
-                out.append(match_len)
-                i += match_len
-            else:
-                out.append(0)
-                out.append(int(arr[i]))
-                i += 1
-        return bytes(out)
+                nxt = prev[cand % window_size]
+                # A slot overwritten by a newer position ends the chain
+                if nxt >= cand:
+                    break
+                cand = nxt
+                chain += 1
+        if match_len >= min_match:
+            out[o] = 1
+            out[o + 1] = match_dist >> 8
+            out[o + 2] = match_dist & 0xFF
+            out[o + 3] = match_len
+            o += 4
+            step = match_len
+        else:
+            out[o] = 0
+            out[o + 1] = data[i]
+            o += 2
+            step = 1
+        # Index every consumed position so later matches can refer to it
+        for p in range(i, min(i + step, n - 2)):
+            h = ((int(data[p]) << 10) ^ (int(data[p + 1]) << 5) ^ int(data[p + 2])) & mask
+            prev[p % window_size] = head[h]
+            head[h] = p
+        i += step
+    return o
 
-    @staticmethod
-    def decompress(data: bytes) -> bytes:
-        """Decompress bytes produced by :meth:`compress`."""
-        arr = np.frombuffer(data, dtype=np.uint8)
-        out = bytearray()
-        i = 0
-        n = arr.size
-        while i < n:
-            flag = int(arr[i])
-            i += 1
-            if flag == 0:
-                if i >= n:
-                    raise ValueError("Corrupted LZMA data")
-                out.append(int(arr[i]))
-                i += 1
-            elif flag == 1:
-                if i + 2 >= n:
-                    raise ValueError("Corrupted LZMA data")
-                dist = (int(arr[i]) << 8) | int(arr[i + 1])
-                i += 2
-                match_len = int(arr[i])
-                i += 1
-                if dist == 0 or match_len == 0 or dist > len(out):
-                    raise ValueError("Corrupted LZMA data")
-                start = len(out) - dist
-                segment = np.frombuffer(bytes(out), dtype=np.uint8)[start : start + match_len]
-                out.extend(segment.tobytes())
-            else:
-                raise ValueError("Invalid LZMA flag")
-        return bytes(out)
+
+if njit is not None:
+    # nogil lets the GUI keep running while a worker thread compresses
+    _lz77_encode = njit(cache=True, nogil=True)(_lz77_encode)
 
 
 class LZMA:
@@ -105,43 +108,33 @@ class LZMA:
     WINDOW_SIZE = 4096
     MIN_MATCH = 3
     MAX_MATCH = 255
+    MAX_CHAIN = 32  # hash-chain candidates probed per position
 
     @staticmethod
     def compress(data: bytes) -> bytes:
-        out = bytearray()
-        i = 0
-        length = len(data)
-        while i < length:
-            window_start = max(0, i - LZMA.WINDOW_SIZE)
-            match_len = 0
-            match_dist = 0
-            # Search for longest match in window
-            for dist in range(1, i - window_start + 1):
-                j = 0
-                while (
-                    j < LZMA.MAX_MATCH
-                    and i + j < length
-                    and data[i - dist + j] == data[i + j]
-                ):
-                    j += 1
-                if j > match_len:
-                    match_len = j
-                    match_dist = dist
-            if match_len >= LZMA.MIN_MATCH:
-                out.append(1)
-                out.extend(match_dist.to_bytes(2, "big"))
-                out.append(match_len)
-                i += match_len
-            else:
-                out.append(0)
-                out.append(data[i])
-                i += 1
-        return bytes(out)
+        """Compress ``data``; the match search runs natively when Numba is available."""
+        if njit is not None:
+            buf = np.frombuffer(data, dtype=np.uint8)
+            out = np.empty(2 * buf.size, dtype=np.uint8)
+            head = np.full(_HASH_SIZE, -1, dtype=np.int32)
+            prev = np.full(LZMA.WINDOW_SIZE, -1, dtype=np.int32)
+        else:
+            buf = data
+            out = bytearray(2 * len(data))
+            head = [-1] * _HASH_SIZE
+            prev = [-1] * LZMA.WINDOW_SIZE
+        size = _lz77_encode(
+            buf, out, head, prev,
+            LZMA.WINDOW_SIZE, LZMA.MIN_MATCH, LZMA.MAX_MATCH, LZMA.MAX_CHAIN,
+        )
+        return bytes(out[:size])
 
     @staticmethod
     def decompress(data: bytes) -> bytes:
         out = bytearray()
+        append = out.append
         i = 0
+        pos = 0
         length = len(data)
         while i < length:
             flag = data[i]
@@ -149,91 +142,709 @@ class LZMA:
             if flag == 0:
                 if i >= length:
                     raise ValueError("Corrupted LZMA data")
-                out.append(data[i])
+                append(data[i])
                 i += 1
+                pos += 1
             elif flag == 1:
                 if i + 2 >= length:
                     raise ValueError("Corrupted LZMA data")
-                dist = int.from_bytes(data[i : i + 2], "big")
-                i += 2
-                match_len = data[i]
-                i += 1
-                if dist == 0 or match_len == 0 or dist > len(out):
+                # Indexing gives ints directly; no slice + int.from_bytes
+                dist = (data[i] << 8) | data[i + 1]
+                match_len = data[i + 2]
+                i += 3
+                if dist == 0 or match_len == 0 or dist > pos:
                     raise ValueError("Corrupted LZMA data")
-                start = len(out) - dist
-                for j in range(match_len):
-                    out.append(out[start + j])
+                start = pos - dist
+                if dist >= match_len:
+                    # Source and destination do not overlap: one slice copy
+                    out += out[start : start + match_len]
+                else:
+                    # Overlapping match repeats the last ``dist`` bytes
+                    reps, rest = divmod(match_len, dist)
+                    out += out[start:] * reps + out[start : start + rest]
+                pos += match_len
             else:
                 raise ValueError("Invalid LZMA flag")
         return bytes(out)
 
 
+def _lzw_encode(data, codes, keys, values, max_codes):
+    """Encode ``data`` into ``codes`` using an open-addressing dictionary.
+
+    Entries are keyed by ``(prefix_code << 8) | byte`` like the pure-Python
+    path; ``keys`` (initialised to -1) and ``values`` form a linear-probing
+    hash table whose size is a power of two.  With ``max_codes`` set, code
+    256 is :data:`CLEAR_CODE`: once the dictionary holds ``max_codes``
+    codes it is emitted and the dictionary starts over.  ``max_codes == 0``
+    never clears.  Returns ``(n_codes, next_code)``.
+    """
+    mask = keys.size - 1
+    first_code = 257 if max_codes else 256
+    next_code = first_code
+    w = np.int64(data[0])
+    n = 0
+    for i in range(1, data.size):
+        byte = data[i]
+        key = (w << 8) | byte
+        slot = (key * 0x9E3779B1) & mask
+        while True:
+            found = keys[slot]
+            if found == key:
+                w = np.int64(values[slot])
+                break
+            if found == -1:
+                codes[n] = w
+                n += 1
+                keys[slot] = key
+                values[slot] = next_code
+                next_code += 1
+                if next_code == max_codes:
+                    codes[n] = 256
+                    n += 1
+                    keys[:] = -1
+                    next_code = first_code
+                w = np.int64(byte)
+                break
+            slot = (slot + 1) & mask
+    codes[n] = w
+    return n + 1, next_code
+
+
+if njit is not None:
+    _lzw_encode = njit(cache=True, nogil=True)(_lzw_encode)
+
+
+def _lzw_decode(codes, out, starts, lens, clear):
+    """Decode LZW ``codes`` into the preallocated ``out`` buffer.
+
+    Every dictionary entry is a run of bytes that has already been written
+    to ``out``, so entries are stored as ``(starts[code], lens[code])``
+    instead of as separate ``bytes`` objects.  With ``clear`` set, code 256
+    resets the dictionary and entries start at 257.  Returns the number of
+    bytes written, ``-1`` for an invalid code or ``-2`` if ``out`` is too
+    small.
+    """
+    first_code = 257 if clear else 256
+    next_code = first_code
+    prev_start = 0
+    prev_len = 0
+    pos = 0
+    for k in range(codes.size):
+        code = codes[k]
+        if clear and code == 256:
+            next_code = first_code
+            prev_len = 0
+            continue
+        if code < 256:
+            if pos >= out.size:
+                return -2
+            out[pos] = code
+            length = 1
+        else:
+            if prev_len == 0:
+                # The first code after a (re)start must be a literal
+                return -1
+            if code < next_code:
+                src = starts[code]
+                length = lens[code]
+            elif code == next_code:
+                # KwKwK case: previous entry plus its own first byte; the
+                # forward copy below produces that last byte naturally
+                src = prev_start
+                length = prev_len + 1
+            else:
+                return -1
+            if pos + length > out.size:
+                return -2
+            for t in range(length):
+                out[pos + t] = out[src + t]
+        if prev_len:
+            # New entry is the previous output plus the first byte of this
+            # one, which already sit next to each other in ``out``
+            if next_code >= starts.size:
+                return -1
+            starts[next_code] = prev_start
+            lens[next_code] = prev_len + 1
+            next_code += 1
+        prev_start = pos
+        prev_len = length
+        pos += length
+    return pos
+
+
+if njit is not None:
+    _lzw_decode = njit(cache=True, nogil=True)(_lzw_decode)
+
+
+def _code_width(max_code: int) -> int:
+    """Fewest whole bytes (2, 3 or 4) that hold every code up to ``max_code``."""
+    if max_code <= 0xFFFF:
+        return 2
+    if max_code <= 0xFFFFFF:
+        return 3
+    return 4
+
+
+# Byte-width packers, one specialised function per width so the width is
+# dispatched once per stream.  ``codes`` is anything exposing ``uint32``
+# items through the buffer protocol (NumPy or ``array('I')``), which NumPy
+# reads without copying.
+def _pack_w2(codes) -> bytes:
+    return np.frombuffer(codes, dtype=np.uint32).astype(">u2").tobytes()
+
+
+def _pack_w3(codes) -> bytes:
+    codes = np.frombuffer(codes, dtype=np.uint32)
+    # Each big-endian byte written straight into its column
+    out = np.empty((codes.size, 3), dtype=np.uint8)
+    out[:, 0] = codes >> 16
+    out[:, 1] = codes >> 8
+    out[:, 2] = codes
+    return out.tobytes()
+
+
+def _pack_w4(codes) -> bytes:
+    return np.frombuffer(codes, dtype=np.uint32).astype(">u4").tobytes()
+
+
+def _unpack_w2(data) -> np.ndarray:
+    return np.frombuffer(data, dtype=">u2").astype(np.uint32)
+
+
+def _unpack_w3(data) -> np.ndarray:
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.uint32)
+    return (raw[:, 0] << 16) | (raw[:, 1] << 8) | raw[:, 2]
+
+
+def _unpack_w4(data) -> np.ndarray:
+    return np.frombuffer(data, dtype=">u4").astype(np.uint32)
+
+
+# Bytes per code -> big-endian packer / unpacker into ``uint32``
+_PACKERS = {2: _pack_w2, 3: _pack_w3, 4: _pack_w4}
+_UNPACKERS = {2: _unpack_w2, 3: _unpack_w3, 4: _unpack_w4}
+
+
+# Variable-width codes start at 9 bits.  Code ``k`` of a stream can be at
+# most ``255 + k`` (each earlier code added one entry), so its width is
+# known to both sides without any extra signalling.
+MIN_CODE_BITS = 9
+_WIDTH_LIMITS = 1 << np.arange(MIN_CODE_BITS, 33, dtype=np.int64)
+
+# Bounded dictionaries: code 256 clears the dictionary and real entries
+# start at 257.  The encoder clears as soon as the dictionary would need
+# codes wider than ``max_code_bits``, i.e. after the same number of codes
+# every time, so widths still follow from the code position alone.
+CLEAR_CODE = 256
+LZW_MAX_CODE_BITS = 16
+# Widest dictionary limit accepted; 0 means unbounded
+_MAX_CODE_BITS_LIMIT = 24
+
+
+def _valid_max_code_bits(max_code_bits: int) -> bool:
+    """Whether ``max_code_bits`` is 0 or in ``MIN_CODE_BITS..24``."""
+    return not max_code_bits or MIN_CODE_BITS <= max_code_bits <= _MAX_CODE_BITS_LIMIT
+
+# Codes the pure-Python encoder collects before packing them into the output
+_SINK_CODES = 1 << 16
+
+
+def _code_widths(count: int, max_code_bits: int = 0, start: int = 0) -> np.ndarray:
+    """Bit width of codes ``start`` to ``start + count`` of a stream.
+
+    ``max_code_bits`` is 0 for an unbounded dictionary, otherwise the
+    dictionary is cleared every ``2**max_code_bits - 256`` codes (the clear
+    code included) and the widths restart with it.
+    """
+    k = np.arange(start, start + count, dtype=np.int64)
+    if max_code_bits:
+        k %= (1 << max_code_bits) - 256
+        top = CLEAR_CODE
+    else:
+        top = 255
+    # Code k can be at most top + k: widen once that no longer fits
+    return MIN_CODE_BITS + np.searchsorted(_WIDTH_LIMITS - top, k, side="right")
+
+
+def _pack_bits_kernel(codes, widths, out, acc, n_bits):
+    """Write ``codes`` MSB-first using ``widths[i]`` bits each.
+
+    ``acc`` holds ``n_bits`` (< 8) bits left over from an earlier call;
+    only whole bytes are written.  Returns ``(bytes_used, acc, n_bits)``.
+    """
+    pos = 0
+    for i in range(codes.size):
+        acc = (acc << widths[i]) | codes[i]
+        n_bits += widths[i]
+        while n_bits >= 8:
+            n_bits -= 8
+            out[pos] = (acc >> n_bits) & 0xFF
+            pos += 1
+        # Only the not yet written low bits are kept
+        acc &= (1 << n_bits) - 1
+    return pos, acc, n_bits
+
+
+if njit is not None:
+    _pack_bits_kernel = njit(cache=True, nogil=True)(_pack_bits_kernel)
+
+
+def _pack_bits(
+    codes: np.ndarray, widths: np.ndarray, acc: int = 0, n_bits: int = 0
+) -> tuple[bytes, int, int]:
+    """Pack ``codes`` into an MSB-first bit stream, ``widths[i]`` bits each.
+
+    See :func:`_pack_bits_kernel` for the carried ``acc`` / ``n_bits``.
+    """
+    total = n_bits + int(widths.sum())
+    if njit is not None:
+        out = np.empty(total // 8, dtype=np.uint8)
+        _, acc, n_bits = _pack_bits_kernel(codes, widths, out, acc, n_bits)
+        return out.tobytes(), int(acc), int(n_bits)
+    # Vectorised fallback: set every bit of every code in one pass per bit
+    # position, then let packbits assemble the bytes
+    bits = np.zeros(total, dtype=np.uint8)
+    for j in range(n_bits):
+        bits[j] = (acc >> (n_bits - 1 - j)) & 1
+    offsets = n_bits + np.cumsum(widths) - widths
+    codes = codes.astype(np.int64)
+    for j in range(int(widths.max())):
+        sel = widths > j
+        bits[offsets[sel] + j] = (codes[sel] >> (widths[sel] - 1 - j)) & 1
+    whole = total // 8 * 8
+    acc = 0
+    for bit in bits[whole:].tolist():
+        acc = (acc << 1) | bit
+    return np.packbits(bits[:whole]).tobytes(), acc, total - whole
+
+
+class _BitWriter:
+    """Streams variable-width LZW codes to a binary file object.
+
+    Codes can be written in any number of chunks; the widths continue from
+    one chunk to the next and a partial byte is carried over until
+    :meth:`flush`.
+    """
+
+    def __init__(self, out, max_code_bits: int = 0):
+        self.out = out
+        self.max_code_bits = max_code_bits
+        self.count = 0
+        self.written = 0
+        self.max_width = MIN_CODE_BITS
+        self._acc = 0
+        self._n_bits = 0
+
+    def write(self, codes) -> None:
+        if len(codes) == 0:
+            return
+        widths = _code_widths(len(codes), self.max_code_bits, self.count)
+        self.count += len(codes)
+        self.max_width = max(self.max_width, int(widths.max()))
+        packed, self._acc, self._n_bits = _pack_bits(
+            np.frombuffer(codes, dtype=np.uint32), widths, self._acc, self._n_bits
+        )
+        self.out.write(packed)
+        self.written += len(packed)
+
+    def flush(self) -> None:
+        """Write out the last partial byte, zero padded."""
+        if self._n_bits:
+            self.out.write(bytes(((self._acc << (8 - self._n_bits)) & 0xFF,)))
+            self.written += 1
+            self._acc = self._n_bits = 0
+
+
+def _unpack_bits(data: bytes, max_code_bits: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Inverse of :func:`_pack_bits`; returns ``(codes, widths)``.
+
+    The stream is padded to a whole byte with fewer than 8 bits, which can
+    never hold a whole code, so the code count follows from the length.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    total_bits = 8 * buf.size
+    widths = _code_widths(total_bits // MIN_CODE_BITS, max_code_bits)
+    ends = np.cumsum(widths)
+    n = int(np.searchsorted(ends, total_bits, side="right"))
+    widths = widths[:n]
+    starts = (ends[:n] - widths).astype(np.uint64)
+    # A code spans at most 5 bytes (7 bits of offset + 32 bits of code)
+    padded = np.concatenate((buf, np.zeros(5, dtype=np.uint8))).astype(np.uint64)
+    first = (starts >> np.uint64(3)).astype(np.int64)
+    window = padded[first]
+    for k in range(1, 5):
+        window = (window << np.uint64(8)) | padded[first + k]
+    uwidths = widths.astype(np.uint64)
+    shift = np.uint64(40) - (starts & np.uint64(7)) - uwidths
+    codes = (window >> shift) & ((np.uint64(1) << uwidths) - np.uint64(1))
+    return codes.astype(np.uint32), widths
+
+
 class LZW:
     @staticmethod
-    def compress(data: bytes) -> tuple[bytes, int]:
-        """Compress bytes using a basic LZW algorithm.
+    def _encode(data: bytes, max_code_bits: int = 0, sink=None):
+        """Run LZW over ``data``; returns ``(codes, next_code)``.
 
-        Returns a tuple of (compressed_bytes, bytes_per_code)."""
-        # Initialize dictionary with single-byte entries
-        dictionary: dict[bytes, int] = {bytes([i]): i for i in range(256)}
-        next_code = 256
-        w = b""
-        codes: list[int] = []
-        max_code = 255
+        ``codes`` is a ``uint32`` array from the compiled kernel, or an
+        ``array('I')`` from the pure-Python loop.  A non-zero ``max_code_bits`` bounds the
+        dictionary to that many bits, clearing it with :data:`CLEAR_CODE`
+        whenever it fills up.  With a ``sink`` the codes are instead passed
+        to it in order, in chunks of up to :data:`_SINK_CODES` from the
+        Python loop, and ``codes`` is returned empty.
+        """
+        max_codes = 1 << max_code_bits if max_code_bits else 0
+        if njit is not None and data:
+            src = np.frombuffer(data, dtype=np.uint8)
+            # At most one entry per input byte, or max_codes live at once;
+            # at least 2x that many slots keeps the probe chains short
+            entries = min(src.size, max_codes) if max_codes else src.size
+            slots = 1 << (2 * entries).bit_length()
+            keys = np.full(slots, -1, dtype=np.int64)
+            values = np.empty(slots, dtype=np.int32)
+            # Every clear follows at least 255 ordinary codes
+            codes_arr = np.empty(src.size + src.size // 255 + 1, dtype=np.uint32)
+            n_codes, next_code = _lzw_encode(src, codes_arr, keys, values, max_codes)
+            if sink is not None:
+                sink(codes_arr[:n_codes])
+                return codes_arr[:0], next_code
+            return codes_arr[:n_codes], next_code
+
+        # Entries are keyed by (prefix_code << 8) | byte, so no bytes objects
+        # are built per input byte.  Single bytes are implicitly codes 0-255
+        # and never stored, which also keeps their keys from colliding with
+        # entries whose prefix is code 0.
+        dictionary: dict[int, int] = {}
+        first_code = CLEAR_CODE + 1 if max_codes else 256
+        next_code = first_code
+        w_code = -1
+        # 4 bytes per code instead of a boxed int plus a list slot
+        codes = array("I")
+        emit = codes.append
+        lookup = dictionary.get
         for byte in data:
-            k = bytes([byte])
-            wk = w + k
-            if wk in dictionary:
-                w = wk
+            if w_code < 0:
+                w_code = byte
+                continue
+            key = (w_code << 8) | byte
+            # One probe per byte instead of ``in`` followed by ``[]``
+            nxt = lookup(key)
+            if nxt is not None:
+                w_code = nxt
             else:
-                codes.append(dictionary[w])
-                dictionary[wk] = next_code
-                max_code = max(max_code, next_code)
+                emit(w_code)
+                if sink is not None and len(codes) >= _SINK_CODES:
+                    sink(codes)
+                    codes = array("I")
+                    emit = codes.append
+                dictionary[key] = next_code
                 next_code += 1
-                w = k
-        if w:
-            codes.append(dictionary[w])
-            max_code = max(max_code, dictionary[w])
-
-        if max_code <= 0xFFFF:
-            width = 2
-        elif max_code <= 0xFFFFFF:
-            width = 3
+                if next_code == max_codes:
+                    emit(CLEAR_CODE)
+                    dictionary.clear()
+                    next_code = first_code
+                w_code = byte
+        if w_code >= 0:
+            emit(w_code)
+        if sink is not None:
+            sink(codes)
+            codes = array("I")
+        return codes, next_code
+
+    @staticmethod
+    def compress(data: bytes) -> tuple[bytes, int]:
+        """Compress bytes using a basic LZW algorithm.
+
+        Returns a tuple of (compressed_bytes, bytes_per_code)."""
+        codes, next_code = LZW._encode(data)
+        width = _code_width(next_code - 1)
+        return _PACKERS[width](codes), width
+
+    @staticmethod
+    def compress_to_stream(
+        data: bytes, out, max_code_bits: int = LZW_MAX_CODE_BITS
+    ) -> tuple[int, int]:
+        """Compress bytes with variable-width codes written straight to ``out``.
+
+        Codes start at :data:`MIN_CODE_BITS` bits and grow by one bit each time
+        the dictionary outgrows the current width (see :func:`_code_widths`).
+        The dictionary never needs more than ``max_code_bits`` bits: when it
+        fills up it is cleared and rebuilt from the data that follows, which
+        keeps memory bounded and lets it track local statistics.  Pass 0 for
+        an unbounded dictionary.
+
+        Codes are packed and written as they are produced, so no list of
+        every code is built.  Returns ``(bytes_written, max_width)``.
+        """
+        if not _valid_max_code_bits(max_code_bits):
+            raise ValueError("Invalid maximum code width")
+        writer = _BitWriter(out, max_code_bits)
+        LZW._encode(data, max_code_bits, sink=writer.write)
+        writer.flush()
+        return writer.written, writer.max_width
+
+    @staticmethod
+    def compress_bits(data: bytes, max_code_bits: int = LZW_MAX_CODE_BITS) -> tuple[bytes, int]:
+        """Like :meth:`compress_to_stream`, returning ``(compressed_bytes, max_width)``."""
+        buf = io.BytesIO()
+        _, max_width = LZW.compress_to_stream(data, buf, max_code_bits)
+        return buf.getvalue(), max_width
+
+    @staticmethod
+    def _decode(codes: np.ndarray, size_hint: int | None, max_code_bits: int = 0) -> bytes:
+        """Rebuild the bytes for a ``uint32`` array of LZW ``codes``.
+
+        When Numba is available decoding runs in a compiled kernel writing
+        into a preallocated buffer.  ``size_hint`` is the expected decompressed
+        length: with it the buffer is sized exactly and longer output is
+        rejected; without it the buffer starts at a guess and is doubled until
+        the data fits.  ``max_code_bits`` is as for :meth:`compress_bits`.
+        """
+        # Codes are dense from 0 and every code after the first adds at most
+        # one entry, so the entry tables are allocated once
+        if max_code_bits:
+            size = min(CLEAR_CODE + 1 + codes.size, 1 << max_code_bits)
         else:
-            width = 4
+            size = 256 + codes.size
+        clear = bool(max_code_bits)
+        if njit is not None:
+            starts = np.empty(size, dtype=np.int64)
+            lens = np.empty(size, dtype=np.int64)
+            capacity = size_hint if size_hint is not None else max(4 * codes.size, 256)
+            while True:
+                out = np.empty(capacity, dtype=np.uint8)
+                n = _lzw_decode(codes, out, starts, lens, clear)
+                if n != -2 or size_hint is not None:
+                    break
+                capacity *= 2
+            if n == -1:
+                raise ValueError("Bad compressed code")
+            if n == -2:
+                raise ValueError("Decompressed data size mismatch")
+            return out[:n].tobytes()
+        # tolist() hands the loop plain ints, which index faster than NumPy
+        # scalars
+        codes = codes.tolist()
+        # Like the compiled kernel, entries are ``(start, length)`` runs of
+        # bytes already written to ``result`` rather than ``bytes`` objects of
+        # their own
+        starts = array("q", bytes(8 * size))
+        lens = array("q", [1]) * size
+        first_code = CLEAR_CODE + 1 if clear else 256
+        next_code = first_code
 
-        out = bytearray()
+        result = bytearray()
+        append = result.append
+        prev_start = 0
+        prev_len = 0
+        pos = 0
         for code in codes:
-            out.extend(code.to_bytes(width, "big"))
-        return bytes(out), width
+            if code < 256:
+                append(code)
+                length = 1
+            elif clear and code == CLEAR_CODE:
+                next_code = first_code
+                prev_len = 0
+                continue
+            elif not prev_len:
+                # The first code after a (re)start must be a literal
+                raise ValueError("Bad compressed code")
+            elif code < next_code:
+                start = starts[code]
+                length = lens[code]
+                result += result[start:start + length]
+            elif code == next_code:
+                # KwKwK case: previous entry plus its own first byte
+                result += result[prev_start:prev_start + prev_len]
+                append(result[prev_start])
+                length = prev_len + 1
+            else:
+                raise ValueError("Bad compressed code")
+            if prev_len:
+                # New entry is the previous output plus the first byte of this
+                # one, which already sit next to each other in ``result``
+                if next_code >= size:
+                    raise ValueError("Bad compressed code")
+                starts[next_code] = prev_start
+                lens[next_code] = prev_len + 1
+                next_code += 1
+            prev_start = pos
+            prev_len = length
+            pos += length
+        return bytes(result)
 
     @staticmethod
-    def decompress(data: bytes, width: int) -> bytes:
-        """Decompress bytes produced by `compress` using ``width`` bytes per code."""
-        if width not in (2, 3, 4):
+    def decompress(data: bytes, width: int, size_hint: int | None = None) -> bytes:
+        """Decompress bytes produced by `compress` using ``width`` bytes per code.
+
+        See :meth:`_decode` for ``size_hint``.
+        """
+        unpack = _UNPACKERS.get(width)
+        if unpack is None:
             raise ValueError("Invalid code width")
         if len(data) % width != 0:
             raise ValueError("Corrupted LZW data length")
-        codes = [int.from_bytes(data[i:i+width], "big") for i in range(0, len(data), width)]
-        if not codes:
-            return b""
-        dictionary: dict[int, bytes] = {i: bytes([i]) for i in range(256)}
-        next_code = 256
-
-        w = dictionary[codes[0]]
-        result = bytearray(w)
-        for code in codes[1:]:
-            if code in dictionary:
-                entry = dictionary[code]
-            elif code == next_code:
-                entry = w + w[:1]
-            else:
-                raise ValueError("Bad compressed code")
-            result.extend(entry)
-            dictionary[next_code] = w + entry[:1]
-            next_code += 1
-            w = entry
-        return bytes(result)
+        # One C pass instead of an int.from_bytes call per code
+        return LZW._decode(unpack(data), size_hint)
+
+    @staticmethod
+    def decompress_bits(
+        data: bytes,
+        max_width: int,
+        size_hint: int | None = None,
+        max_code_bits: int = LZW_MAX_CODE_BITS,
+    ) -> bytes:
+        """Decompress bytes produced by `compress_bits`.
+
+        ``max_code_bits`` must match the value used to compress.  See
+        :meth:`_decode` for ``size_hint``.
+        """
+        if not _valid_max_code_bits(max_code_bits):
+            raise ValueError("Invalid maximum code width")
+        codes, widths = _unpack_bits(data, max_code_bits)
+        if widths.size and widths.max() > max_width:
+            raise ValueError("Corrupted LZW data length")
+        return LZW._decode(codes, size_hint, max_code_bits)
+
+
+# Algorithm ids stored in the .cmpt365 header
+ALG_LZW = 1
+ALG_LZMA = 2
+ALG_ZLIB = 3
+
+# Version 1 stores one compressed payload; version 2 splits the pixels into
+# independently compressed blocks listed in a table after the header;
+# version 3 packs LZW codes into a variable-width bit stream; version 4
+# stores blocks that would not shrink as raw bytes
+CMPT_VERSION = 4
+
+# Target uncompressed size of one block; rounded down to whole scanlines
+BLOCK_SIZE = 256 * 1024
+
+# .cmpt365 file header: magic, version, algorithm id, LZW code width,
+# original bits per pixel, then width, height and payload length (20 bytes).
+# From version 2 the code widths live in the block table and the header's
+# ``code_width`` byte holds the LZW dictionary limit in bits (0: unbounded)
+_CMPT_HEADER = struct.Struct("<4sBBBBIII")
+
+# Version 2+: a ``<u4`` block count follows the header, then one entry per
+# block, then the concatenated block payloads (``data_len`` bytes in total).
+# ``code_width`` is bytes per LZW code in version 2 and the widest code in
+# bits from version 3.  Version 4 entries start with the block kind
+_BLOCK_ENTRY_V2 = np.dtype([
+    ("code_width", "u1"),
+    ("raw_len", "<u4"),
+    ("length", "<u4"),
+])
+_BLOCK_ENTRY = np.dtype([
+    ("kind", "u1"),
+    ("code_width", "u1"),
+    ("raw_len", "<u4"),
+    ("length", "<u4"),
+])
+
+# Block kinds: raw pixel bytes, or the output of the file's algorithm
+BLOCK_STORED = 0
+BLOCK_COMPRESSED = 1
+_BLOCK_COUNT = struct.Struct("<I")
+
+
+def _compress_block(block: bytes, alg: int, max_code_bits: int) -> tuple[int, int, bytes]:
+    """Compress one block with ``alg``; returns ``(kind, code_width, payload)``.
+
+    Like Deflate's stored blocks, a block that does not get smaller is kept
+    as raw bytes, so noisy regions never expand the file.
+    """
+    code_width = 0
+    if alg == ALG_ZLIB:
+        compressed = zlib.compress(block, 6)
+    elif alg == ALG_LZMA:
+        compressed = LZMA.compress(block)
+    elif alg == ALG_LZW:
+        compressed, code_width = LZW.compress_bits(block, max_code_bits)
+    else:
+        raise ValueError("Unsupported compression algorithm")
+    if len(compressed) >= len(block):
+        return BLOCK_STORED, 0, block
+    return BLOCK_COMPRESSED, code_width, compressed
+
+
+def _decompress_block(
+    data: bytes,
+    alg: int,
+    code_width: int,
+    size_hint: int,
+    version: int = CMPT_VERSION,
+    max_code_bits: int = 0,
+    kind: int = BLOCK_COMPRESSED,
+) -> bytes:
+    """Inverse of :func:`_compress_block` for a file of format ``version``.
+
+    Stored blocks come back as the (bytes-like) ``data`` itself.
+    """
+    if kind == BLOCK_STORED:
+        return data
+    if kind != BLOCK_COMPRESSED:
+        raise ValueError("Corrupted CMPT block table")
+    if alg == ALG_ZLIB:
+        return zlib.decompress(data)
+    if alg == ALG_LZW:
+        if version < 3:
+            return LZW.decompress(data, code_width, size_hint=size_hint)
+        return LZW.decompress_bits(
+            data, code_width, size_hint=size_hint, max_code_bits=max_code_bits
+        )
+    if alg == ALG_LZMA:
+        return LZMA.decompress(data)
+    raise ValueError("Unsupported compression algorithm")
+
+
+def _map_blocks(fn, *iterables):
+    """``map`` over the blocks, on a thread pool once there is more than one.
+
+    zlib and the Numba kernels release the GIL, so the blocks really do run
+    on separate cores; threads also keep this safe to call from the GUI.
+    Results are yielded in order as they are consumed, so the caller can
+    write each one out and drop it before the next arrives.  The inputs are
+    consumed lazily too: only a few blocks per worker are in flight at once.
+    """
+    args = zip(*iterables)
+    head = list(islice(args, 2))
+    workers = os.cpu_count() or 1
+    if len(head) <= 1 or workers == 1:
+        yield from (fn(*a) for a in chain(head, args))
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for a in chain(head, args):
+            pending.append(pool.submit(fn, *a))
+            if len(pending) > 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _iter_blocks(chunks, block_size: int):
+    """Regroup an iterable of byte chunks into ``block_size`` byte blocks.
+
+    Only the last block may be shorter.  Chunks can be anything exposing the
+    buffer protocol, such as NumPy arrays or ``bytes``.
+    """
+    buf = bytearray()
+    for chunk in chunks:
+        # Through a flat memoryview, so NumPy arrays append as raw bytes
+        buf += memoryview(chunk).cast("B")
+        while len(buf) >= block_size:
+            yield bytes(buf[:block_size])
+            del buf[:block_size]
+    if buf:
+        yield bytes(buf)
+
+
+def _umask() -> int:
+    """The process umask (only readable by setting it, so it is put back)."""
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
 
 
 def save_cmpt365(
@@ -241,36 +852,115 @@ def save_cmpt365(
     width: int,
     height: int,
     bits_per_pixel: int,
-    pixels: bytes,
+    pixels: bytes | Iterable[bytes],
+    alg: int = ALG_ZLIB,
+    max_code_bits: int = LZW_MAX_CODE_BITS,
 ) -> tuple[int, int, int]:
     """Compress and save raw pixel bytes to a ``.cmpt365`` file.
 
     ``bits_per_pixel`` records the original colour depth so the viewer can
     display accurate metadata.  The pixel data itself is always stored as
-    bytes and compressed using a simplified LZMA implementation.
+    bytes and compressed with ``alg``: the standard library's DEFLATE
+    (:data:`ALG_ZLIB`, the default) or the from-scratch :class:`LZMA` /
+    :class:`LZW` implementations.  The pixels are cut into blocks of about
+    :data:`BLOCK_SIZE` bytes which are compressed in parallel.
+    ``max_code_bits`` bounds the LZW dictionary (see :meth:`LZW.compress_bits`).
+
+    ``pixels`` can also be an iterable of byte chunks (for instance
+    :meth:`BMPParser.iter_rows`), which are cut into blocks and compressed
+    as they arrive, so the whole image never has to be held in memory.  It
+    must then add up to exactly ``width * height`` pixels.
 
     Returns ``(original_size, compressed_size, elapsed_ms)``.
     """
+    if alg not in (ALG_LZW, ALG_LZMA, ALG_ZLIB):
+        raise ValueError("Unsupported compression algorithm")
     start = time.perf_counter()
-    compressed = LZMA.compress(pixels)
-    code_width = 0  # not used by this implementation
-    elapsed_ms = int((time.perf_counter() - start) * 1000)
+    row_bytes = max(1, width * ((bits_per_pixel + 7) // 8))
+    block_size = max(1, BLOCK_SIZE // row_bytes) * row_bytes
+    if isinstance(pixels, (bytes, bytearray, memoryview)):
+        size = len(pixels)
+        blocks = (pixels[i : i + block_size] for i in range(0, size, block_size))
+    else:
+        size = row_bytes * height
+        blocks = _iter_blocks(pixels, block_size)
+    if alg != ALG_LZW:
+        max_code_bits = 0
+    # The table size is known up front from the pixel count, even when the
+    # blocks themselves are still to come
+    n = -(-size // block_size)
+    table = np.zeros(n, dtype=_BLOCK_ENTRY)
+    count = _BLOCK_COUNT.pack(n)
+    table_offset = _CMPT_HEADER.size + len(count)
 
-    header = bytearray()
-    header.extend(b"CMPT")  # magic
-    header.append(1)  # version
-    header.append(2)  # algorithm id for LZMA
-    header.append(code_width)  # unused for LZMA
-    header.append(bits_per_pixel & 0xFF)  # original colour depth
-    header.extend(width.to_bytes(4, "little"))
-    header.extend(height.to_bytes(4, "little"))
-    header.extend(len(compressed).to_bytes(4, "little"))
+    # Streamed into a temporary file next to ``path`` and moved over it only
+    # once complete, so a failure part way never clobbers an existing file
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+    )
+    try:
+        # One large buffer so the payload goes out in as few writes as
+        # possible. Each block is written as soon as it is compressed; the
+        # header and block table are filled in afterwards, once the sizes
+        # are known
+        with open(fd, "wb", buffering=1 << 20) as f:
+            f.seek(table_offset + table.nbytes)
+            # Lengths are noted as blocks are handed out, which is always
+            # before their results come back
+            raw_lens: list[int] = []
 
-    with open(path, "wb") as f:
-        f.write(header)
-        f.write(compressed)
+            def counted(blocks):
+                for block in blocks:
+                    raw_lens.append(len(block))
+                    yield block
 
-    return len(pixels), len(header) + len(compressed), elapsed_ms
+            results = _map_blocks(
+                _compress_block, counted(blocks), repeat(alg), repeat(max_code_bits)
+            )
+            for i, (kind, code_width, compressed) in enumerate(results):
+                if i >= n:
+                    raise ValueError("Pixel data size mismatch")
+                table[i] = (kind, code_width, raw_lens[i], len(compressed))
+                f.write(compressed)
+            if int(table["raw_len"].sum()) != size:
+                raise ValueError("Pixel data size mismatch")
+            elapsed_ms = int((time.perf_counter() - start) * 1000)
+            data_len = int(table["length"].sum())
+
+            # code widths live in the block table; the header byte holds the limit
+            header = _CMPT_HEADER.pack(
+                b"CMPT", CMPT_VERSION, alg, max_code_bits, bits_per_pixel & 0xFF,
+                width, height, data_len,
+            )
+            head = [header, count, table.tobytes()]
+            f.flush()
+            if hasattr(os, "pwritev"):
+                # Header, count and table go out in one syscall without being
+                # joined first, and the file position is left alone
+                written = os.pwritev(f.fileno(), head, 0)
+                if written != sum(map(len, head)):
+                    raise OSError(f"Short write of the CMPT header ({written} bytes)")
+            else:
+                f.seek(0)
+                f.write(b"".join(head))
+                f.flush()
+        # mkstemp creates the file 0600; give it the mode ``open(path, "wb")``
+        # would have, keeping an existing file's permissions
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_umask()
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    total = table_offset + table.nbytes + data_len
+    return size, total, elapsed_ms
 
 
 def load_cmpt365(path: str) -> tuple[int, int, int, bytes]:
@@ -279,37 +969,103 @@ def load_cmpt365(path: str) -> tuple[int, int, int, bytes]:
     Returns ``(width, height, bits_per_pixel, pixel_bytes)``.
     """
     with open(path, "rb") as f:
-        magic = f.read(4)
-        if magic != b"CMPT":
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Invalid CMPT file")
+        # Mapped rather than read: the payload is never copied into a bytes
+        # object, and the OS pages it in as the decoders get to it
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # Every view into the map, released before it is closed below
+    views = []
+    try:
+        if mm[:4] != b"CMPT":
             raise ValueError("Invalid CMPT file")
-        version = int.from_bytes(f.read(1), "little")
-        alg = int.from_bytes(f.read(1), "little")
-        code_width = int.from_bytes(f.read(1), "little")
-        bits_per_pixel = int.from_bytes(f.read(1), "little")
-        width = int.from_bytes(f.read(4), "little")
-        height = int.from_bytes(f.read(4), "little")
-        data_len = int.from_bytes(f.read(4), "little")
-        data = f.read(data_len)
-        if len(data) < data_len:
+        if len(mm) < _CMPT_HEADER.size:
+            raise ValueError("Truncated CMPT file")
+        # Decode every header field in one C call, straight from the map
+        (_, version, alg, code_width, bits_per_pixel,
+         width, height, data_len) = _CMPT_HEADER.unpack_from(mm)
+        pos = _CMPT_HEADER.size
+        # From version 3 the code width byte is the LZW dictionary limit
+        if version >= 3 and not _valid_max_code_bits(code_width):
+            raise ValueError("Corrupted CMPT header")
+        if version == 1:
+            table = None
+        elif version in (2, 3, 4):
+            entry = _BLOCK_ENTRY if version >= 4 else _BLOCK_ENTRY_V2
+            if pos + _BLOCK_COUNT.size > len(mm):
+                raise ValueError("Truncated CMPT file")
+            (n_blocks,) = _BLOCK_COUNT.unpack_from(mm, pos)
+            pos += _BLOCK_COUNT.size
+            entries = mm[pos : pos + n_blocks * entry.itemsize]
+            if len(entries) < n_blocks * entry.itemsize:
+                raise ValueError("Truncated CMPT file")
+            table = np.frombuffer(entries, dtype=entry)
+            pos += len(entries)
+        else:
+            raise ValueError("Unsupported CMPT version")
+        if pos + data_len > len(mm):
             raise ValueError("Truncated CMPT file")
+        data = memoryview(mm)[pos : pos + data_len]
+        views.append(data)
 
-    if alg == 1:
-        pixels = LZW.decompress(data, code_width)
-    elif alg == 2:
-        pixels = LZMA.decompress(data)
-    else:
-        raise ValueError("Unsupported compression algorithm")
+        bytes_per_pixel = (bits_per_pixel + 7) // 8
+        expected = width * height * bytes_per_pixel
 
-    bytes_per_pixel = (bits_per_pixel + 7) // 8
-    expected = width * height * bytes_per_pixel
-    if len(pixels) != expected:
-        raise ValueError("Decompressed data size mismatch")
+        if table is None:
+            # bytes() so a block handed back as-is does not outlive the map
+            pixels = bytes(_decompress_block(data, alg, code_width, expected, version))
+        else:
+            if int(table["length"].sum()) != data_len:
+                raise ValueError("Corrupted CMPT block table")
+            ends = np.cumsum(table["length"]).tolist()
+            starts = [0] + ends[:-1]
+            if version >= 4:
+                kinds = table["kind"].tolist()
+            else:
+                kinds = repeat(BLOCK_COMPRESSED)
+            blocks = [data[a:b] for a, b in zip(starts, ends)]
+            views += blocks
+            parts = _map_blocks(
+                _decompress_block,
+                blocks,
+                repeat(alg),
+                table["code_width"].tolist(),
+                table["raw_len"].tolist(),
+                repeat(version),
+                repeat(code_width),
+                kinds,
+            )
+            try:
+                pixels = b"".join(parts)
+            finally:
+                # Waits for blocks still decoding if one of them failed
+                parts.close()
+
+        if len(pixels) != expected:
+            raise ValueError("Decompressed data size mismatch")
+    finally:
+        # Closed here rather than left to the GC, which on Windows would
+        # keep the file locked after a failed load
+        for view in views:
+            view.release()
+        try:
+            mm.close()
+        except BufferError:
+            # A failed decode can leave NumPy views into the map alive in
+            # its traceback; the GC closes the map once they are gone, and
+            # the decode error is the one worth reporting
+            pass
 
     return width, height, bits_per_pixel, pixels
 
+
+_KB = 1 << 10
+_MB = 1 << 20
+
+
 def format_size(size: int) -> str:
-    if size < 1024:
+    if size < _KB:
         return f"{size} bytes"
-    if size < 1024 * 1024:
-        return f"{size} bytes ({size/1024:.1f} KB)"
-    return f"{size} bytes ({size/1024/1024:.1f} MB)"
+    if size < _MB:
+        return f"{size} bytes ({size / _KB:.1f} KB)"
+    return f"{size} bytes ({size / _MB:.1f} MB)"
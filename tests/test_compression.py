@@ -0,0 +1,297 @@
+"""Round-trip and corruption tests for the .cmpt365 format and its codecs."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+from contextlib import ExitStack
+from unittest import mock
+
+import numpy as np
+
+import compression
+from compression import (
+    ALG_LZMA,
+    ALG_LZW,
+    ALG_ZLIB,
+    BLOCK_STORED,
+    LZMA,
+    LZW,
+    _BLOCK_COUNT,
+    _BLOCK_ENTRY,
+    _BLOCK_ENTRY_V2,
+    _CMPT_HEADER,
+    load_cmpt365,
+    save_cmpt365,
+)
+
+ALGORITHMS = (ALG_ZLIB, ALG_LZW, ALG_LZMA)
+
+WIDTH = 64
+HEIGHT = 120
+BPP = 24
+# Small blocks so a test image spans several of them
+TEST_BLOCK_SIZE = 4096
+
+
+def _sample_pixels() -> bytes:
+    """RGB bytes: noise in the top half, a smooth gradient below.
+
+    The noisy blocks do not shrink and are stored raw, the rest compress.
+    """
+    rng = np.random.default_rng(365)
+    img = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    half = HEIGHT // 2
+    img[:half] = rng.integers(0, 256, (half, WIDTH, 3), dtype=np.uint8)
+    ramp = np.arange(WIDTH, dtype=np.uint8) * 3
+    img[half:] = ramp[None, :, None]
+    return img.tobytes()
+
+
+def _compress_v1(alg, raw):
+    """One payload; LZW codes are fixed-width bytes."""
+    if alg == ALG_LZW:
+        return LZW.compress(raw)
+    if alg == ALG_LZMA:
+        return LZMA.compress(raw), 0
+    return zlib.compress(raw), 0
+
+
+def _write_v1(path, alg, raw):
+    payload, code_width = _compress_v1(alg, raw)
+    header = _CMPT_HEADER.pack(
+        b"CMPT", 1, alg, code_width, BPP, WIDTH, HEIGHT, len(payload)
+    )
+    with open(path, "wb") as f:
+        f.write(header + payload)
+
+
+def _write_blocks(path, version, alg, raw, max_code_bits=0):
+    """A version 2 (byte-width LZW) or 3 (bit-packed LZW) block file."""
+    row = WIDTH * 3
+    step = TEST_BLOCK_SIZE // row * row
+    blocks = [raw[i : i + step] for i in range(0, len(raw), step)]
+    table = np.zeros(len(blocks), dtype=_BLOCK_ENTRY_V2)
+    payloads = []
+    for i, block in enumerate(blocks):
+        if alg == ALG_LZW and version == 3:
+            payload, code_width = LZW.compress_bits(block, max_code_bits)
+        else:
+            payload, code_width = _compress_v1(alg, block)
+        table[i] = (code_width, len(block), len(payload))
+        payloads.append(payload)
+    data = b"".join(payloads)
+    header = _CMPT_HEADER.pack(
+        b"CMPT", version, alg, max_code_bits, BPP, WIDTH, HEIGHT, len(data)
+    )
+    with open(path, "wb") as f:
+        f.write(header + _BLOCK_COUNT.pack(len(blocks)) + table.tobytes() + data)
+
+
+class RoundTripTests(unittest.TestCase):
+    """Every algorithm and format version, with the compiled kernels."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        patcher = mock.patch.object(compression, "BLOCK_SIZE", TEST_BLOCK_SIZE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.raw = _sample_pixels()
+
+    def path(self, name="image.cmpt365"):
+        return os.path.join(self.dir, name)
+
+    def assertLoads(self, path, raw=None):
+        width, height, bpp, pixels = load_cmpt365(path)
+        self.assertEqual((width, height, bpp), (WIDTH, HEIGHT, BPP))
+        self.assertEqual(pixels, self.raw if raw is None else raw)
+
+    def test_version_4_round_trip(self):
+        for alg in ALGORITHMS:
+            with self.subTest(alg=alg):
+                size, total, _ = save_cmpt365(self.path(), WIDTH, HEIGHT, BPP, self.raw, alg)
+                self.assertEqual(size, len(self.raw))
+                self.assertEqual(total, os.path.getsize(self.path()))
+                self.assertLoads(self.path())
+
+    def test_version_4_unbounded_lzw_dictionary(self):
+        save_cmpt365(self.path(), WIDTH, HEIGHT, BPP, self.raw, ALG_LZW, max_code_bits=0)
+        self.assertLoads(self.path())
+
+    def test_version_4_small_lzw_dictionary_clears(self):
+        raw = bytes(np.random.default_rng(1).integers(0, 4, len(self.raw), dtype=np.uint8))
+        save_cmpt365(self.path(), WIDTH, HEIGHT, BPP, raw, ALG_LZW, max_code_bits=9)
+        self.assertLoads(self.path(), raw)
+
+    def test_streamed_rows_round_trip(self):
+        row = WIDTH * 3
+        rows = (self.raw[i : i + row] for i in range(0, len(self.raw), row))
+        save_cmpt365(self.path(), WIDTH, HEIGHT, BPP, rows, ALG_ZLIB)
+        self.assertLoads(self.path())
+
+    def test_incompressible_blocks_are_stored(self):
+        for alg in ALGORITHMS:
+            with self.subTest(alg=alg):
+                save_cmpt365(self.path(), WIDTH, HEIGHT, BPP, self.raw, alg)
+                with open(self.path(), "rb") as f:
+                    data = f.read()
+                (n,) = _BLOCK_COUNT.unpack_from(data, _CMPT_HEADER.size)
+                table = np.frombuffer(
+                    data, _BLOCK_ENTRY, n, _CMPT_HEADER.size + _BLOCK_COUNT.size
+                )
+                kinds = set(table["kind"].tolist())
+                self.assertIn(BLOCK_STORED, kinds)
+                self.assertGreater(len(kinds), 1)
+                self.assertLoads(self.path())
+
+    def test_all_stored_blocks(self):
+        raw = bytes(np.random.default_rng(2).integers(0, 256, len(self.raw), dtype=np.uint8))
+        _, total, _ = save_cmpt365(self.path(), WIDTH, HEIGHT, BPP, raw, ALG_ZLIB)
+        self.assertLess(total, len(raw) + 512)
+        self.assertLoads(self.path(), raw)
+
+    def test_version_1_round_trip(self):
+        for alg in ALGORITHMS:
+            with self.subTest(alg=alg):
+                _write_v1(self.path(), alg, self.raw)
+                self.assertLoads(self.path())
+
+    def test_version_2_round_trip(self):
+        for alg in ALGORITHMS:
+            with self.subTest(alg=alg):
+                _write_blocks(self.path(), 2, alg, self.raw)
+                self.assertLoads(self.path())
+
+    def test_version_3_round_trip(self):
+        for alg in ALGORITHMS:
+            for max_code_bits in (0, 12):
+                with self.subTest(alg=alg, max_code_bits=max_code_bits):
+                    bits = max_code_bits if alg == ALG_LZW else 0
+                    _write_blocks(self.path(), 3, alg, self.raw, bits)
+                    self.assertLoads(self.path())
+
+    def test_lzw_bit_stream_round_trip(self):
+        for max_code_bits in (0, 9, 16, 24):
+            with self.subTest(max_code_bits=max_code_bits):
+                packed, max_width = LZW.compress_bits(self.raw, max_code_bits)
+                self.assertEqual(
+                    LZW.decompress_bits(packed, max_width, len(self.raw), max_code_bits),
+                    self.raw,
+                )
+
+    def test_empty_image(self):
+        save_cmpt365(self.path(), 0, 0, BPP, b"", ALG_LZW)
+        self.assertEqual(load_cmpt365(self.path()), (0, 0, BPP, b""))
+
+    def test_failed_save_keeps_existing_file(self):
+        save_cmpt365(self.path(), WIDTH, HEIGHT, BPP, self.raw)
+        before = os.path.getsize(self.path())
+        with self.assertRaises(ValueError):
+            save_cmpt365(self.path(), WIDTH, HEIGHT, BPP, iter([self.raw[:1000]]))
+        self.assertEqual(os.path.getsize(self.path()), before)
+        self.assertEqual(os.listdir(self.dir), ["image.cmpt365"])
+        self.assertLoads(self.path())
+
+
+@unittest.skipIf(compression.njit is None, "Numba is not installed")
+class PurePythonRoundTripTests(RoundTripTests):
+    """The same round trips through the plain Python loops."""
+
+    def setUp(self):
+        super().setUp()
+        stack = ExitStack()
+        self.addCleanup(stack.close)
+        stack.enter_context(mock.patch.object(compression, "njit", None))
+        for name in ("_lz77_encode", "_lzw_encode", "_lzw_decode", "_pack_bits_kernel"):
+            kernel = getattr(compression, name)
+            stack.enter_context(
+                mock.patch.object(compression, name, getattr(kernel, "py_func", kernel))
+            )
+
+
+class CorruptFileTests(unittest.TestCase):
+    """Damaged files must fail with ValueError, not crash the decoders."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        patcher = mock.patch.object(compression, "BLOCK_SIZE", TEST_BLOCK_SIZE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.raw = _sample_pixels()
+
+    def saved(self, alg=ALG_LZW) -> bytearray:
+        path = os.path.join(self.dir, "good.cmpt365")
+        save_cmpt365(path, WIDTH, HEIGHT, BPP, self.raw, alg)
+        with open(path, "rb") as f:
+            return bytearray(f.read())
+
+    def assertRejected(self, data):
+        path = os.path.join(self.dir, "bad.cmpt365")
+        with open(path, "wb") as f:
+            f.write(data)
+        with self.assertRaises(ValueError):
+            load_cmpt365(path)
+
+    def test_empty_file(self):
+        self.assertRejected(b"")
+
+    def test_bad_magic(self):
+        data = self.saved()
+        data[:4] = b"BMP!"
+        self.assertRejected(data)
+
+    def test_unknown_version(self):
+        data = self.saved()
+        data[4] = 9
+        self.assertRejected(data)
+
+    def test_unknown_algorithm(self):
+        data = self.saved()
+        data[5] = 42
+        self.assertRejected(data)
+
+    def test_invalid_dictionary_limit(self):
+        for value in (1, 8, 25, 63, 64, 70, 200):
+            with self.subTest(max_code_bits=value):
+                data = self.saved()
+                data[6] = value
+                self.assertRejected(data)
+
+    def test_truncated(self):
+        data = self.saved()
+        for size in (3, _CMPT_HEADER.size - 1, _CMPT_HEADER.size + 2,
+                     _CMPT_HEADER.size + 10, len(data) - 1):
+            with self.subTest(size=size):
+                self.assertRejected(data[:size])
+
+    def test_wrong_payload_length(self):
+        data = self.saved()
+        data_len = _CMPT_HEADER.unpack_from(data)[-1]
+        _CMPT_HEADER.pack_into(data, 0, *_CMPT_HEADER.unpack_from(data)[:-1], data_len - 1)
+        self.assertRejected(data)
+
+    def test_bad_block_kind(self):
+        data = self.saved()
+        data[_CMPT_HEADER.size + _BLOCK_COUNT.size] = 7
+        self.assertRejected(data)
+
+    def test_wrong_dimensions(self):
+        data = self.saved(ALG_ZLIB)
+        header = list(_CMPT_HEADER.unpack_from(data))
+        header[5] += 1  # width
+        _CMPT_HEADER.pack_into(data, 0, *header)
+        self.assertRejected(data)
+
+    def test_garbled_lzw_payload(self):
+        data = self.saved()
+        (n,) = _BLOCK_COUNT.unpack_from(data, _CMPT_HEADER.size)
+        start = _CMPT_HEADER.size + _BLOCK_COUNT.size + n * _BLOCK_ENTRY.itemsize
+        data[start:] = b"\xff" * (len(data) - start)
+        self.assertRejected(data)
+
+
+if __name__ == "__main__":
+    unittest.main()